@@ -1,14 +1,71 @@
+import asyncio
+from typing import Awaitable, Callable, Optional, TypeVar
 from core.claude import Claude
 from mcp_client import MCPClient
-from core.tools import ToolManager
-from anthropic.types import MessageParam
+from core.tools import ToolCatalog, ToolManager
+from core.history import HistoryManager
+from anthropic.types import Message, MessageParam
+
+T = TypeVar("T")
+
+USAGE_KEYS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_read_input_tokens",
+    "cache_creation_input_tokens",
+)
 
 
 class Chat:
-    def __init__(self, claude_service: Claude, clients: dict[str, MCPClient]):
+    def __init__(
+        self,
+        claude_service: Claude,
+        clients: dict[str, MCPClient],
+        history_token_budget: int = 100_000,
+        turn_timeout: Optional[float] = None,
+    ):
         self.claude_service: Claude = claude_service
         self.clients: dict[str, MCPClient] = clients
+        self.tool_catalog = ToolCatalog()
         self.messages: list[MessageParam] = []
+        self.history = HistoryManager(
+            claude_service, token_budget=history_token_budget
+        )
+        # Token usage summed over every model call of the last run()
+        self.turn_usage: dict[str, int] = {key: 0 for key in USAGE_KEYS}
+        # Seconds run() may take, and the event loop time by which the
+        # current run() must be done
+        self.turn_timeout = turn_timeout
+        self.deadline: Optional[float] = None
+
+    def _record_usage(self, response: Message):
+        for key in USAGE_KEYS:
+            self.turn_usage[key] += getattr(response.usage, key, None) or 0
+
+    def remaining_time(self) -> Optional[float]:
+        """Seconds left before the current turn's deadline, if it has one."""
+        if self.deadline is None:
+            return None
+        return self.deadline - asyncio.get_running_loop().time()
+
+    async def _before_deadline(
+        self, step: Awaitable[T], description: str
+    ) -> T:
+        """Awaits step, cancelling it and raising TimeoutError if the turn's
+        deadline passes first."""
+        remaining = self.remaining_time()
+        if remaining is None:
+            return await step
+        try:
+            return await asyncio.wait_for(step, max(remaining, 0))
+        except asyncio.TimeoutError:
+            raise TimeoutError(
+                f"{description} did not finish within the turn's "
+                f"{self.turn_timeout:g}s limit"
+            ) from None
+
+    async def load_tools(self) -> list:
+        return await ToolManager.get_all_tools(self.clients, self.tool_catalog)
 
     async def _process_query(self, query: str):
         self.messages.append({"role": "user", "content": query})
@@ -16,23 +73,60 @@ class Chat:
     async def run(
         self,
         query: str,
+        on_text: Optional[Callable[[str], None]] = None,
     ) -> str:
-        final_text_response = ""
+        self.turn_usage = {key: 0 for key in USAGE_KEYS}
+        if self.turn_timeout is not None:
+            self.deadline = asyncio.get_running_loop().time() + self.turn_timeout
+        try:
+            return await self._run(query, on_text)
+        finally:
+            self.deadline = None
 
+    async def _run(
+        self,
+        query: str,
+        on_text: Optional[Callable[[str], None]],
+    ) -> str:
+        final_text_response = ""
         await self._process_query(query)
 
         while True:
-            response = self.claude_service.chat(
-                messages=self.messages,
-                tools=await ToolManager.get_all_tools(self.clients),
+            remaining = self.remaining_time()
+            if remaining is not None and remaining <= 0:
+                # Tool calls still pending at the deadline were cancelled,
+                # so stop rather than let Claude ask for more
+                raise TimeoutError(
+                    f"The turn was stopped after {self.turn_timeout:g}s"
+                )
+
+            await self._before_deadline(
+                self.history.compact(self.messages), "Compacting the history"
+            )
+            tools = await self._before_deadline(
+                self.load_tools(), "Listing tools"
+            )
+
+            response = await self._before_deadline(
+                self.claude_service.chat(
+                    messages=self.messages,
+                    tools=tools,
+                    on_text=on_text,
+                ),
+                "Claude's response",
             )
 
+            self._record_usage(response)
             self.claude_service.add_assistant_message(self.messages, response)
 
             if response.stop_reason == "tool_use":
-                print(self.claude_service.text_from_message(response))
+                if not on_text:
+                    print(self.claude_service.text_from_message(response))
                 tool_result_parts = await ToolManager.execute_tool_requests(
-                    self.clients, response
+                    self.clients,
+                    response,
+                    deadline=self.deadline,
+                    catalog=self.tool_catalog,
                 )
 
                 self.claude_service.add_user_message(
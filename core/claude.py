@@ -1,12 +1,40 @@
-from anthropic import Anthropic
+from typing import Callable, Optional
+import httpx
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
 from anthropic.types import Message
 
+CACHE_CONTROL = {"type": "ephemeral"}
+
 
 class Claude:
+    # One keep-alive connection pool shared by every Claude instance, so
+    # later turns and other sessions reuse warm TLS connections
+    _http_client: Optional[httpx.AsyncClient] = None
+
     def __init__(self, model: str):
-        self.client = Anthropic()
+        self.client = AsyncAnthropic(http_client=self._get_http_client())
         self.model = model
 
+    @classmethod
+    def _get_http_client(cls) -> httpx.AsyncClient:
+        if cls._http_client is None or cls._http_client.is_closed:
+            cls._http_client = DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=100,
+                    max_keepalive_connections=20,
+                    # Outlive the user's think time between turns
+                    keepalive_expiry=300,
+                )
+            )
+        return cls._http_client
+
+    @classmethod
+    async def close(cls):
+        """Closes the shared connection pool."""
+        if cls._http_client is not None:
+            await cls._http_client.aclose()
+            cls._http_client = None
+
     def add_user_message(self, messages: list, message):
         user_message = {
             "role": "user",
@@ -30,7 +58,7 @@ class Claude:
             [block.text for block in message.content if block.type == "text"]
         )
 
-    def chat(
+    async def chat(
         self,
         messages,
         system=None,
@@ -39,7 +67,22 @@ class Claude:
         tools=None,
         thinking=False,
         thinking_budget=1024,
+        on_text: Optional[Callable[[str], None]] = None,
+        cache=True,
     ) -> Message:
+        """Sends messages to Claude and returns the complete response.
+
+        If on_text is given the response is streamed, and on_text is called
+        with each text delta as it arrives. With cache enabled, prompt cache
+        breakpoints are placed on the tools, the system prompt and the
+        newest message, so each request reuses the prefix of the previous
+        one. The caller's lists are never modified.
+        """
+        if cache:
+            messages = self._cache_messages(messages)
+            tools = self._cache_tools(tools)
+            system = self._cache_system(system)
+
         params = {
             "model": self.model,
             "max_tokens": 8000,
@@ -60,5 +103,64 @@ class Claude:
         if system:
             params["system"] = system
 
-        message = self.client.messages.create(**params)
+        if on_text:
+            return await self._stream(params, on_text)
+
+        message = await self.client.messages.create(**params)
         return message
+
+    def _cache_block(self, block):
+        if not isinstance(block, dict):
+            block = block.model_dump(exclude_none=True)
+        return {**block, "cache_control": CACHE_CONTROL}
+
+    def _cache_tools(self, tools):
+        if not tools:
+            return tools
+        return [*tools[:-1], self._cache_block(tools[-1])]
+
+    def _cache_system(self, system):
+        if not system:
+            return system
+        if isinstance(system, str):
+            system = [{"type": "text", "text": system}]
+        return [*system[:-1], self._cache_block(system[-1])]
+
+    def _cache_messages(self, messages):
+        if not messages:
+            return messages
+
+        last = messages[-1]
+        content = last["content"]
+        if isinstance(content, str):
+            if not content:
+                return messages
+            content = [{"type": "text", "text": content}]
+        if not content:
+            return messages
+
+        last_block = content[-1]
+        last_type = (
+            last_block.get("type")
+            if isinstance(last_block, dict)
+            else last_block.type
+        )
+        if last_type in ("thinking", "redacted_thinking"):
+            # Thinking blocks cannot carry a cache breakpoint
+            return messages
+
+        content = [*content[:-1], self._cache_block(content[-1])]
+        return [*messages[:-1], {**last, "content": content}]
+
+    async def _stream(
+        self, params: dict, on_text: Callable[[str], None]
+    ) -> Message:
+        async with self.client.messages.stream(**params) as stream:
+            async for event in stream:
+                if event.type == "text":
+                    on_text(event.text)
+                elif event.type == "message_delta" and event.delta.stop_reason:
+                    # Every content block, including tool_use inputs, is
+                    # complete once the stop reason arrives
+                    return stream.current_message_snapshot
+            return await stream.get_final_message()
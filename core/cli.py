@@ -1,4 +1,5 @@
 from typing import List, Optional
+from mcp import types
 from prompt_toolkit import PromptSession
 from prompt_toolkit.completion import Completer, Completion
 from prompt_toolkit.key_binding import KeyBindings
@@ -9,6 +10,7 @@ from prompt_toolkit.document import Document
 from prompt_toolkit.buffer import Buffer
 
 from core.cli_chat import CliChat
+from mcp_client import ConnectionLostError
 
 
 class CommandAutoSuggest(AutoSuggest):
@@ -111,8 +113,12 @@ class UnifiedCompleter(Completer):
 
 
 class CliApp:
-    def __init__(self, agent: CliChat):
+    def __init__(
+        self, agent: CliChat, stream: bool = True, show_usage: bool = False
+    ):
         self.agent = agent
+        self.stream = stream
+        self.show_usage = show_usage
         self.resources = []
         self.prompts = []
 
@@ -177,8 +183,20 @@ class CliApp:
         )
 
     async def initialize(self):
+        await self.refresh_tools()
         await self.refresh_resources()
         await self.refresh_prompts()
+        self.agent.doc_client.add_resource_listener(self._on_resource_event)
+
+    async def _on_resource_event(self, notification):
+        if isinstance(notification, types.ResourceListChangedNotification):
+            await self.refresh_resources()
+
+    async def refresh_tools(self):
+        try:
+            await self.agent.load_tools()
+        except Exception as e:
+            print(f"Error loading tools: {e}")
 
     async def refresh_resources(self):
         try:
@@ -196,6 +214,18 @@ class CliApp:
         except Exception as e:
             print(f"Error refreshing prompts: {e}")
 
+    def _print_delta(self, text: str):
+        print(text, end="", flush=True)
+
+    def _print_usage(self):
+        usage = self.agent.turn_usage
+        print(
+            f"[tokens] input: {usage['input_tokens']}"
+            f" output: {usage['output_tokens']}"
+            f" cache read: {usage['cache_read_input_tokens']}"
+            f" cache write: {usage['cache_creation_input_tokens']}"
+        )
+
     async def run(self):
         while True:
             try:
@@ -203,8 +233,18 @@ class CliApp:
                 if not user_input.strip():
                     continue
 
-                response = await self.agent.run(user_input)
-                print(f"\nResponse:\n{response}")
+                if self.stream:
+                    print("\nResponse:")
+                    await self.agent.run(user_input, on_text=self._print_delta)
+                    print()
+                else:
+                    response = await self.agent.run(user_input)
+                    print(f"\nResponse:\n{response}")
+
+                if self.show_usage:
+                    self._print_usage()
 
+            except (TimeoutError, ConnectionLostError) as e:
+                print(f"Error: {e}")
             except KeyboardInterrupt:
                 break
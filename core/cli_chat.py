@@ -1,4 +1,6 @@
-from typing import List, Tuple
+import asyncio
+from typing import List, Optional
+from urllib.parse import quote
 from mcp.types import Prompt, PromptMessage
 from anthropic.types import MessageParam
 
@@ -13,39 +15,118 @@ class CliChat(Chat):
         doc_client: MCPClient,
         clients: dict[str, MCPClient],
         claude_service: Claude,
+        history_token_budget: int = 100_000,
+        inline_token_budget: int = 20_000,
+        turn_timeout: Optional[float] = None,
     ):
-        super().__init__(clients=clients, claude_service=claude_service)
+        super().__init__(
+            clients=clients,
+            claude_service=claude_service,
+            history_token_budget=history_token_budget,
+            turn_timeout=turn_timeout,
+        )
 
         self.doc_client: MCPClient = doc_client
+        # Estimated tokens of @mentioned documents to inline per query;
+        # documents beyond it are described instead, for Claude to page through
+        self.inline_token_budget = inline_token_budget
+        self._doc_ids: Optional[set[str]] = None
+        self._doc_ids_version: int = -1
 
     async def list_prompts(self) -> list[Prompt]:
         return await self.doc_client.list_prompts()
 
     async def list_docs_ids(self) -> list[str]:
-        return await self.doc_client.read_resource("docs://documents")
+        doc_ids = []
+        async for page in self.doc_client.read_resource_pages(
+            "docs://documents/page/start"
+        ):
+            doc_ids += page["items"]
+        return doc_ids
+
+    async def get_doc_content(
+        self, doc_id: str, version: Optional[int] = None
+    ) -> str:
+        return await self.doc_client.read_resource(
+            f"docs://documents/{quote(doc_id, safe='')}",
+            version=version,
+            timeout=self.remaining_time(),
+        )
 
-    async def get_doc_content(self, doc_id: str) -> str:
-        return await self.doc_client.read_resource(f"docs://documents/{doc_id}")
+    async def get_docs_metadata(self, doc_ids: list[str]) -> dict:
+        quoted_ids = ",".join(quote(doc_id, safe="") for doc_id in doc_ids)
+        # Always fresh, since the versions it returns validate cached
+        # document contents
+        return await self.doc_client.read_resource(
+            f"docs://documents/metadata/{quoted_ids}",
+            use_cache=False,
+            timeout=self.remaining_time(),
+        )
 
     async def get_prompt(
         self, command: str, doc_id: str
     ) -> list[PromptMessage]:
         return await self.doc_client.get_prompt(command, {"doc_id": doc_id})
 
-    async def _extract_resources(self, query: str) -> str:
-        mentions = [word[1:] for word in query.split() if word.startswith("@")]
+    async def _get_doc_id_set(self) -> set[str]:
+        """Returns the known doc ids, re-read only after the server reports
+        a change to its resource list or the client reconnects."""
+        version = self.doc_client.resources_version
+        if self._doc_ids is None or self._doc_ids_version != version:
+            self._doc_ids = set(await self.list_docs_ids())
+            self._doc_ids_version = version
+        return self._doc_ids
 
-        doc_ids = await self.list_docs_ids()
-        mentioned_docs: list[Tuple[str, str]] = []
+    async def _extract_resources(self, query: str) -> str:
+        mentions = [
+            word[1:]
+            for word in query.split()
+            if word.startswith("@") and len(word) > 1
+        ]
+        if not mentions:
+            return ""
+
+        # Mentions of unknown ids are dropped without asking the server
+        doc_ids = await self._get_doc_id_set()
+        mentioned_ids = [
+            doc_id for doc_id in dict.fromkeys(mentions) if doc_id in doc_ids
+        ]
+        if not mentioned_ids:
+            return ""
+
+        # Only metadata is fetched up front, so oversized documents are
+        # never downloaded
+        metadata = await self.get_docs_metadata(mentioned_ids)
+
+        budget = self.inline_token_budget
+        bodies: dict[str, str] = {}
+        inlined_ids = []
+        versions = []
+        for doc in metadata["documents"]:
+            if doc["token_estimate"] <= budget:
+                budget -= doc["token_estimate"]
+                inlined_ids.append(doc["doc_id"])
+                versions.append(doc["version"])
+            else:
+                bodies[doc["doc_id"]] = (
+                    f"[Document not included: about {doc['token_estimate']} "
+                    f"tokens over {doc['line_count']} lines. Use "
+                    "read_doc_contents with a line range or offset and limit "
+                    "to read it a page at a time.]"
+                )
 
-        for doc_id in doc_ids:
-            if doc_id in mentions:
-                content = await self.get_doc_content(doc_id)
-                mentioned_docs.append((doc_id, content))
+        contents = await asyncio.gather(
+            *(
+                self.get_doc_content(doc_id, version)
+                for doc_id, version in zip(inlined_ids, versions)
+            )
+        )
+        bodies.update(zip(inlined_ids, contents))
 
+        found_ids = [doc["doc_id"] for doc in metadata["documents"]]
         return "".join(
-            f'\n<document id="{doc_id}">\n{content}\n</document>\n'
-            for doc_id, content in mentioned_docs
+            f'\n<document id="{doc_id}">\n{bodies[doc_id]}\n</document>\n'
+            for doc_id in found_ids
         )
 
     async def _process_command(self, query: str) -> bool:
@@ -56,7 +137,7 @@ class CliChat(Chat):
         command = words[0].replace("/", "")
 
         messages = await self.doc_client.get_prompt(
-            command, {"doc_id": words[1]}
+            command, {"doc_id": words[1]}, timeout=self.remaining_time()
         )
 
         self.messages += convert_prompt_messages_to_message_params(messages)
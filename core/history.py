@@ -0,0 +1,214 @@
+import re
+import json
+import asyncio
+from typing import Optional
+from anthropic.types import MessageParam
+
+from core.claude import Claude
+
+# Rough size of a token in characters, used to estimate prompt size
+# without a round trip to the token counting API
+CHARS_PER_TOKEN = 4
+
+DOCUMENT_PATTERN = re.compile(
+    r'(<document id="[^"]*">\n).*?(\n</document>)', re.DOTALL
+)
+DOCUMENT_STUB = "[Document content omitted to save context. Use read_doc_contents to read it again.]"
+TOOL_RESULT_STUB = "[Tool result omitted to save context. Call the tool again if it is needed.]"
+
+SUMMARY_PROMPT = """
+Summarize the following conversation between a user and an assistant.
+Keep every fact, decision, document id and open question that later turns
+might depend on. Leave out pleasantries and anything that is no longer relevant.
+
+<conversation>
+{transcript}
+</conversation>
+"""
+
+
+def _block_field(block, name: str, default=None):
+    if isinstance(block, dict):
+        return block.get(name, default)
+    return getattr(block, name, default)
+
+
+class HistoryManager:
+    """Keeps a conversation's message history within a token budget.
+
+    Once the estimated size of the history exceeds the budget, tool
+    results and inlined document bodies in older turns are replaced by
+    short stubs. If that is not enough, the older turns are summarized in
+    the background and swapped for the summary on a later call to
+    compact(). Only whole turns are ever rewritten, so a tool_use block is
+    never separated from its tool_result.
+    """
+
+    def __init__(
+        self,
+        claude_service: Claude,
+        token_budget: int = 100_000,
+        keep_recent_turns: int = 2,
+    ):
+        self.claude_service = claude_service
+        self.token_budget = token_budget
+        self.keep_recent_turns = max(keep_recent_turns, 1)
+
+        self._summary_task: Optional[asyncio.Task] = None
+        # Number of leading messages covered by the pending summary. Messages
+        # are only appended or stubbed in place while it runs, so the index
+        # stays valid.
+        self._summary_cutoff: int = 0
+
+    def estimate_tokens(self, messages: list[MessageParam]) -> int:
+        chars = 0
+        for message in messages:
+            content = message["content"]
+            if isinstance(content, str):
+                chars += len(content)
+                continue
+            for block in content:
+                chars += self._block_size(block)
+        return chars // CHARS_PER_TOKEN
+
+    def _block_size(self, block) -> int:
+        block_type = _block_field(block, "type")
+        if block_type == "text":
+            return len(_block_field(block, "text", ""))
+        if block_type == "tool_use":
+            return len(json.dumps(_block_field(block, "input", {})))
+        if block_type == "tool_result":
+            content = _block_field(block, "content", "")
+            if isinstance(content, str):
+                return len(content)
+            return sum(self._block_size(item) for item in content)
+        if block_type == "thinking":
+            return len(_block_field(block, "thinking", ""))
+        return 0
+
+    def _turn_starts(self, messages: list[MessageParam]) -> list[int]:
+        """Indexes of user messages that open a new turn, as opposed to
+        user messages carrying tool results."""
+        starts = []
+        for i, message in enumerate(messages):
+            if message["role"] != "user":
+                continue
+            content = message["content"]
+            if isinstance(content, str) or not any(
+                _block_field(block, "type") == "tool_result"
+                for block in content
+            ):
+                starts.append(i)
+        return starts
+
+    async def compact(self, messages: list[MessageParam]) -> None:
+        """Compacts messages in place if they exceed the token budget."""
+        self._apply_summary(messages)
+
+        if self.estimate_tokens(messages) <= self.token_budget:
+            return
+
+        turn_starts = self._turn_starts(messages)
+        if len(turn_starts) <= self.keep_recent_turns:
+            return
+        cutoff = turn_starts[-self.keep_recent_turns]
+
+        for i in range(cutoff):
+            messages[i] = self._stub_message(messages[i])
+
+        if (
+            self.estimate_tokens(messages) > self.token_budget
+            and self._summary_task is None
+        ):
+            self._summary_cutoff = cutoff
+            self._summary_task = asyncio.create_task(
+                self._summarize(messages[:cutoff])
+            )
+
+    def _stub_message(self, message: MessageParam) -> MessageParam:
+        content = message["content"]
+        if isinstance(content, str):
+            return {**message, "content": self._stub_documents(content)}
+
+        stubbed = []
+        for block in content:
+            block_type = _block_field(block, "type")
+            if block_type == "tool_result":
+                block = {
+                    "type": "tool_result",
+                    "tool_use_id": _block_field(block, "tool_use_id"),
+                    "content": TOOL_RESULT_STUB,
+                    "is_error": _block_field(block, "is_error", False),
+                }
+            elif block_type == "text" and isinstance(block, dict):
+                block = {**block, "text": self._stub_documents(block["text"])}
+            stubbed.append(block)
+        return {**message, "content": stubbed}
+
+    def _stub_documents(self, text: str) -> str:
+        return DOCUMENT_PATTERN.sub(
+            lambda m: f"{m.group(1)}{DOCUMENT_STUB}{m.group(2)}", text
+        )
+
+    def _render_transcript(self, messages: list[MessageParam]) -> str:
+        lines = []
+        for message in messages:
+            speaker = "User" if message["role"] == "user" else "Assistant"
+            content = message["content"]
+            if isinstance(content, str):
+                lines.append(f"{speaker}: {content}")
+                continue
+            for block in content:
+                block_type = _block_field(block, "type")
+                if block_type == "text":
+                    lines.append(f"{speaker}: {_block_field(block, 'text')}")
+                elif block_type == "tool_use":
+                    tool_input = json.dumps(_block_field(block, "input", {}))
+                    lines.append(
+                        f"{speaker} called tool {_block_field(block, 'name')}: {tool_input}"
+                    )
+                elif block_type == "tool_result":
+                    result = _block_field(block, "content", "")
+                    if not isinstance(result, str):
+                        result = json.dumps(result, default=str)
+                    lines.append(f"Tool result: {result}")
+        return "\n".join(lines)
+
+    async def _summarize(self, messages: list[MessageParam]) -> str:
+        transcript = self._render_transcript(messages)
+        response = await self.claude_service.chat(
+            messages=[
+                {
+                    "role": "user",
+                    "content": SUMMARY_PROMPT.format(transcript=transcript),
+                }
+            ],
+            cache=False,
+        )
+        return self.claude_service.text_from_message(response)
+
+    def _apply_summary(self, messages: list[MessageParam]) -> None:
+        task = self._summary_task
+        if task is None or not task.done():
+            return
+
+        cutoff = self._summary_cutoff
+        self._summary_task = None
+        self._summary_cutoff = 0
+
+        try:
+            summary = task.result()
+        except Exception as e:
+            print(f"Error summarizing conversation history: {e}")
+            return
+
+        messages[:cutoff] = [
+            {
+                "role": "user",
+                "content": f"Summary of the conversation so far:\n{summary}",
+            },
+            {
+                "role": "assistant",
+                "content": "Understood. I'll use this summary as context.",
+            },
+        ]
@@ -1,17 +1,41 @@
+import asyncio
 import json
 from typing import Optional, Literal, List
 from mcp.types import CallToolResult, Tool, TextContent
 from mcp_client import MCPClient
-from anthropic.types import Message, ToolResultBlockParam
+from anthropic.types import Message, ToolResultBlockParam, ToolUseBlock
 
 
-class ToolManager:
-    @classmethod
-    async def get_all_tools(cls, clients: dict[str, MCPClient]) -> list[Tool]:
-        """Gets all tools from the provided clients."""
-        tools = []
-        for client in clients.values():
-            tool_models = await client.list_tools()
+class ToolCatalog:
+    """The tools of a set of clients and which client serves each one,
+    kept across turns until a client's tools_version changes."""
+
+    def __init__(self):
+        self._version: Optional[tuple] = None
+        self.tools: list[dict] = []
+        self.routing_index: dict[str, MCPClient] = {}
+
+    @staticmethod
+    def _key(clients: list[MCPClient]) -> tuple:
+        """Identifies the current catalog version of the provided clients."""
+        return tuple((id(client), client.tools_version) for client in clients)
+
+    async def refresh(self, clients: list[MCPClient]) -> None:
+        """Rebuilds the catalog if any client's catalog has changed.
+
+        Tools are listed from all clients in parallel.
+        """
+        key = self._key(clients)
+        if key == self._version:
+            return
+
+        tool_lists = await asyncio.gather(
+            *(client.list_tools() for client in clients)
+        )
+
+        tools: list[dict] = []
+        index: dict[str, MCPClient] = {}
+        for client, tool_models in zip(clients, tool_lists):
             tools += [
                 {
                     "name": t.name,
@@ -20,19 +44,38 @@ class ToolManager:
                 }
                 for t in tool_models
             ]
-        return tools
+            for t in tool_models:
+                # The first client exposing a tool keeps it
+                index.setdefault(t.name, client)
+
+        self.tools = tools
+        self.routing_index = index
+        self._version = key
+
+
+class ToolManager:
+    # Default limits on concurrent tool calls within a single turn
+    max_concurrency: int = 8
+    max_concurrency_per_client: int = 4
+    # Used when no catalog is passed, so tools are still listed only when
+    # they change
+    catalog: ToolCatalog = ToolCatalog()
 
     @classmethod
-    async def _find_client_with_tool(
-        cls, clients: list[MCPClient], tool_name: str
-    ) -> Optional[MCPClient]:
-        """Finds the first client that has the specified tool."""
-        for client in clients:
-            tools = await client.list_tools()
-            tool = next((t for t in tools if t.name == tool_name), None)
-            if tool:
-                return client
-        return None
+    async def get_all_tools(
+        cls,
+        clients: dict[str, MCPClient],
+        catalog: Optional[ToolCatalog] = None,
+    ) -> list[Tool]:
+        """Gets all tools from the provided clients.
+
+        Tools are listed only when they change. The same list object is
+        returned for as long as the catalog is unchanged, so callers must
+        not mutate it.
+        """
+        catalog = catalog or cls.catalog
+        await catalog.refresh(list(clients.values()))
+        return catalog.tools
 
     @classmethod
     def _build_tool_result_part(
@@ -49,59 +92,128 @@ class ToolManager:
             "is_error": status == "error",
         }
 
+    @classmethod
+    async def _execute_tool_request(
+        cls,
+        client: MCPClient,
+        tool_request: ToolUseBlock,
+        turn_limit: asyncio.Semaphore,
+        client_limit: asyncio.Semaphore,
+        deadline: Optional[float] = None,
+    ) -> ToolResultBlockParam:
+        """Executes a single tool request, turning any failure into an error result."""
+        tool_use_id = tool_request.id
+        tool_name = tool_request.name
+        tool_input = tool_request.input
+
+        try:
+            async with turn_limit, client_limit:
+                timeout = None
+                if deadline is not None:
+                    timeout = deadline - asyncio.get_running_loop().time()
+                tool_output: CallToolResult | None = await client.call_tool(
+                    tool_name, tool_input, timeout=timeout
+                )
+            items = []
+            if tool_output:
+                items = tool_output.content
+            content_list = [
+                item.text for item in items if isinstance(item, TextContent)
+            ]
+            content_json = json.dumps(content_list)
+            return cls._build_tool_result_part(
+                tool_use_id,
+                content_json,
+                "error" if tool_output and tool_output.isError else "success",
+            )
+        except TimeoutError as e:
+            print(f"Error executing tool '{tool_name}': {e}")
+            return cls._build_tool_result_part(
+                tool_use_id,
+                json.dumps(
+                    {
+                        "error": "timeout",
+                        "message": (
+                            f"Tool '{tool_name}' did not finish in time and "
+                            "was cancelled. Try a smaller request, or "
+                            "continue without it."
+                        ),
+                    }
+                ),
+                "error",
+            )
+        except Exception as e:
+            error_message = f"Error executing tool '{tool_name}': {e}"
+            print(error_message)
+            return cls._build_tool_result_part(
+                tool_use_id,
+                json.dumps({"error": error_message}),
+                "error",
+            )
+
     @classmethod
     async def execute_tool_requests(
-        cls, clients: dict[str, MCPClient], message: Message
+        cls,
+        clients: dict[str, MCPClient],
+        message: Message,
+        max_concurrency: Optional[int] = None,
+        max_concurrency_per_client: Optional[int] = None,
+        deadline: Optional[float] = None,
+        catalog: Optional[ToolCatalog] = None,
     ) -> List[ToolResultBlockParam]:
-        """Executes a list of tool requests against the provided clients."""
+        """Executes a list of tool requests concurrently against the provided clients.
+
+        Results are returned in the same order as the tool_use blocks in the
+        message. A failing call only affects its own result, and calls still
+        running at deadline, in event loop time, are cancelled.
+        """
         tool_requests = [
             block for block in message.content if block.type == "tool_use"
         ]
-        tool_result_blocks: list[ToolResultBlockParam] = []
-        for tool_request in tool_requests:
-            tool_use_id = tool_request.id
-            tool_name = tool_request.name
-            tool_input = tool_request.input
+        catalog = catalog or cls.catalog
+        try:
+            await catalog.refresh(list(clients.values()))
+        except Exception as e:
+            # Every tool_use still needs a result for the history to stay
+            # valid
+            error_message = f"Error listing tools: {e}"
+            print(error_message)
+            return [
+                cls._build_tool_result_part(
+                    tool_request.id,
+                    json.dumps({"error": error_message}),
+                    "error",
+                )
+                for tool_request in tool_requests
+            ]
+        routing_index = catalog.routing_index
 
-            client = await cls._find_client_with_tool(
-                list(clients.values()), tool_name
+        turn_limit = asyncio.Semaphore(max_concurrency or cls.max_concurrency)
+        client_limits: dict[int, asyncio.Semaphore] = {}
+
+        async def not_found(tool_use_id: str) -> ToolResultBlockParam:
+            return cls._build_tool_result_part(
+                tool_use_id, "Could not find that tool", "error"
             )
 
+        calls = []
+        for tool_request in tool_requests:
+            client = routing_index.get(tool_request.name)
+
             if not client:
-                tool_result_part = cls._build_tool_result_part(
-                    tool_use_id, "Could not find that tool", "error"
-                )
-                tool_result_blocks.append(tool_result_part)
+                calls.append(not_found(tool_request.id))
                 continue
 
-            try:
-                tool_output: CallToolResult | None = await client.call_tool(
-                    tool_name, tool_input
-                )
-                items = []
-                if tool_output:
-                    items = tool_output.content
-                content_list = [
-                    item.text for item in items if isinstance(item, TextContent)
-                ]
-                content_json = json.dumps(content_list)
-                tool_result_part = cls._build_tool_result_part(
-                    tool_use_id,
-                    content_json,
-                    "error"
-                    if tool_output and tool_output.isError
-                    else "success",
-                )
-            except Exception as e:
-                error_message = f"Error executing tool '{tool_name}': {e}"
-                print(error_message)
-                tool_result_part = cls._build_tool_result_part(
-                    tool_use_id,
-                    json.dumps({"error": error_message}),
-                    "error"
-                    if tool_output and tool_output.isError
-                    else "success",
+            client_limit = client_limits.setdefault(
+                id(client),
+                asyncio.Semaphore(
+                    max_concurrency_per_client or cls.max_concurrency_per_client
+                ),
+            )
+            calls.append(
+                cls._execute_tool_request(
+                    client, tool_request, turn_limit, client_limit, deadline
                 )
+            )
 
-            tool_result_blocks.append(tool_result_part)
-        return tool_result_blocks
+        return list(await asyncio.gather(*calls))
@@ -0,0 +1,142 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from typing import Optional, Protocol
+
+from docstore.lines import LineIndex
+from docstore.piece_table import PieceTable
+
+# Rough size of a token in characters, used to estimate how much context
+# a document would take up without tokenizing it
+CHARS_PER_TOKEN = 4
+
+
+class TextSource(Protocol):
+    """Text stored elsewhere, such as in a snapshot file, read on demand."""
+
+    def text(self) -> str: ...
+
+
+class Document:
+    """A stored document: its text, held in a piece table, and a version
+    that increases with every change.
+
+    The content hash, byte size and line index are derived from the text
+    on first use and kept until the next change. A document created with
+    from_source() doesn't read its text until it is first needed.
+    """
+
+    def __init__(
+        self,
+        text: str = "",
+        version: int = 1,
+        modified_at: Optional[float] = None,
+    ):
+        self._table: Optional[PieceTable] = PieceTable(text)
+        self._source: Optional[TextSource] = None
+        self._length = len(text)
+        self.version = version
+        self.modified_at = modified_at or time.time()
+        self._hash: Optional[str] = None
+        self._byte_size: Optional[int] = None
+        self._line_index: Optional[LineIndex] = None
+
+    @classmethod
+    def from_source(
+        cls,
+        source: TextSource,
+        length: int,
+        version: int,
+        modified_at: float,
+    ) -> "Document":
+        """Creates a document of length characters whose text is read from
+        source on first use."""
+        # Skips __init__, which would build an empty piece table; restores
+        # of large stores create millions of these
+        document = cls.__new__(cls)
+        document._table = None
+        document._source = source
+        document._length = length
+        document.version = version
+        document.modified_at = modified_at
+        document._hash = None
+        document._byte_size = None
+        document._line_index = None
+        return document
+
+    @property
+    def source(self) -> Optional[TextSource]:
+        """Where the text will be read from, or None once it is loaded."""
+        return self._source
+
+    @property
+    def table(self) -> PieceTable:
+        if self._table is None:
+            self._table = PieceTable(self._source.text())
+            self._source = None
+        return self._table
+
+    def __len__(self) -> int:
+        if self._table is None:
+            return self._length
+        return len(self._table)
+
+    def text(self) -> str:
+        return self.table.text()
+
+    def slice(self, start: int, end: int) -> str:
+        return self.table.slice(start, end)
+
+    def _digest(self) -> None:
+        data = self.text().encode()
+        self._hash = hashlib.sha256(data).hexdigest()
+        self._byte_size = len(data)
+
+    @property
+    def hash(self) -> str:
+        if self._hash is None:
+            self._digest()
+        return self._hash
+
+    @property
+    def byte_size(self) -> int:
+        if self._byte_size is None:
+            self._digest()
+        return self._byte_size
+
+    @property
+    def line_index(self) -> LineIndex:
+        if self._line_index is None:
+            self._line_index = LineIndex(self.text())
+        return self._line_index
+
+    def metadata(self) -> dict:
+        return {
+            "version": self.version,
+            "hash": self.hash,
+            "byte_size": self.byte_size,
+            "line_count": self.line_index.line_count,
+            "modified_at": datetime.fromtimestamp(
+                self.modified_at, timezone.utc
+            ).isoformat(),
+            "token_estimate": len(self) // CHARS_PER_TOKEN,
+        }
+
+    def _changed(self) -> None:
+        self.version += 1
+        self.modified_at = time.time()
+        self._hash = None
+        self._byte_size = None
+        self._line_index = None
+
+    def replace_range(self, start: int, end: int, text: str) -> None:
+        self.table.replace_range(start, end, text)
+        self._changed()
+
+    def find_all(self, old: str, count: Optional[int] = None) -> list[int]:
+        return self.table.find_all(old, count)
+
+    def replace_spans(self, spans: list[tuple[int, int, str]]) -> None:
+        if spans:
+            self.table.replace_spans(spans)
+            self._changed()
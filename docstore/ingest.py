@@ -0,0 +1,217 @@
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_SUFFIXES = {".md", ".txt", ".pdf", ".docx"}
+
+# Name of the cache directory created inside the ingested directory
+CACHE_DIR_NAME = ".docstore"
+MANIFEST_NAME = "manifest.json"
+
+
+class IngestedDocument(NamedTuple):
+    doc_id: str
+    text: str
+    mtime: float
+    # Hash of the file the text was extracted from
+    sha256: str
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_text(path: Path) -> str:
+    suffix = path.suffix.lower()
+    if suffix == ".pdf":
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            raise RuntimeError("pypdf is required to ingest .pdf files")
+        reader = PdfReader(path)
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+
+    if suffix == ".docx":
+        try:
+            import docx
+        except ImportError:
+            raise RuntimeError("python-docx is required to ingest .docx files")
+        document = docx.Document(path)
+        return "\n".join(paragraph.text for paragraph in document.paragraphs)
+
+    return path.read_text(encoding="utf-8", errors="replace")
+
+
+def _extract_if_changed(
+    path: Path, known_hash: Optional[str]
+) -> tuple[str, Optional[str], Optional[str]]:
+    """Runs in a worker process. Returns the file's hash and, unless the
+    hash matches known_hash, its extracted text or the reason extraction
+    failed."""
+    try:
+        sha256 = file_hash(path)
+        if sha256 == known_hash:
+            return sha256, None, None
+        return sha256, extract_text(path), None
+    except Exception as e:
+        return "", None, f"{type(e).__name__}: {e}"
+
+
+class Ingester:
+    """Loads every supported file under a directory as a document.
+
+    Extracted text is cached in a .docstore directory next to the files,
+    together with a manifest of each file's mtime, size and hash. On later
+    runs a file is re-read only if its mtime or size changed, and its text
+    re-extracted only if its hash changed too. Extraction runs in a process
+    pool, since parsing PDF and Word files is CPU bound.
+
+    If select is given, only files whose doc id it accepts are loaded.
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        cache_dir: Optional[str | Path] = None,
+        max_workers: Optional[int] = None,
+        select: Optional[Callable[[str], bool]] = None,
+    ):
+        self.root = Path(root)
+        self.cache_dir = (
+            Path(cache_dir) if cache_dir else self.root / CACHE_DIR_NAME
+        )
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.select = select
+
+    def scan(self) -> list[Path]:
+        # Other ingesters of the same root may keep their caches in the
+        # default cache directory
+        cache_dirs = {self.cache_dir, self.root / CACHE_DIR_NAME}
+        return sorted(
+            path
+            for path in self.root.rglob("*")
+            if path.suffix.lower() in SUPPORTED_SUFFIXES
+            and path.is_file()
+            and cache_dirs.isdisjoint(path.parents)
+        )
+
+    def _load_manifest(self) -> dict[str, dict]:
+        try:
+            with open(self.cache_dir / MANIFEST_NAME, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest: dict[str, dict]) -> None:
+        path = self.cache_dir / MANIFEST_NAME
+        temp_path = path.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(temp_path, path)
+
+    def _text_path(self, sha256: str) -> Path:
+        return self.cache_dir / "text" / f"{sha256}.txt"
+
+    def _read_cached_text(self, entry: Optional[dict]) -> Optional[str]:
+        if entry is None:
+            return None
+        try:
+            return self._text_path(entry["sha256"]).read_text(encoding="utf-8")
+        except OSError:
+            return None
+
+    def ingest(self) -> list[IngestedDocument]:
+        """Returns the text of every supported file, with its path relative
+        to the root as the doc id, extracting only new and changed files."""
+        (self.cache_dir / "text").mkdir(parents=True, exist_ok=True)
+        old_manifest = self._load_manifest()
+        manifest: dict[str, dict] = {}
+        documents: list[IngestedDocument] = []
+        pending: list[tuple[str, Path, os.stat_result]] = []
+
+        for path in self.scan():
+            doc_id = path.relative_to(self.root).as_posix()
+            if self.select is not None and not self.select(doc_id):
+                continue
+            stat = path.stat()
+            entry = old_manifest.get(doc_id)
+            if (
+                entry is not None
+                and entry["mtime"] == stat.st_mtime
+                and entry["size"] == stat.st_size
+            ):
+                text = self._read_cached_text(entry)
+                if text is not None:
+                    manifest[doc_id] = entry
+                    documents.append(
+                        IngestedDocument(
+                            doc_id, text, stat.st_mtime, entry["sha256"]
+                        )
+                    )
+                    continue
+            pending.append((doc_id, path, stat))
+
+        if pending:
+            known_hashes = []
+            for doc_id, _, _ in pending:
+                entry = old_manifest.get(doc_id)
+                # Without its cached text a file must be extracted again
+                cached = self._read_cached_text(entry) is not None
+                known_hashes.append(entry["sha256"] if cached else None)
+
+            paths = [path for _, path, _ in pending]
+            if len(pending) == 1:
+                results = [_extract_if_changed(paths[0], known_hashes[0])]
+            else:
+                workers = min(self.max_workers, len(pending))
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    results = list(
+                        executor.map(
+                            _extract_if_changed,
+                            paths,
+                            known_hashes,
+                            # Batch small files to cut down on IPC round trips
+                            chunksize=max(1, len(pending) // (workers * 4)),
+                        )
+                    )
+
+            for (doc_id, path, stat), (sha256, text, error) in zip(
+                pending, results
+            ):
+                if error is not None:
+                    logger.warning(f"Skipping {path}: {error}")
+                    continue
+                entry = {
+                    "mtime": stat.st_mtime,
+                    "size": stat.st_size,
+                    "sha256": sha256,
+                }
+                if text is None:
+                    text = self._read_cached_text(entry)
+                else:
+                    self._text_path(sha256).write_text(text, encoding="utf-8")
+                manifest[doc_id] = entry
+                documents.append(
+                    IngestedDocument(doc_id, text, stat.st_mtime, sha256)
+                )
+
+        self._save_manifest(manifest)
+        self._remove_unused_text(manifest)
+        documents.sort(key=lambda document: document.doc_id)
+        return documents
+
+    def _remove_unused_text(self, manifest: dict[str, dict]) -> None:
+        used = {entry["sha256"] for entry in manifest.values()}
+        for path in (self.cache_dir / "text").glob("*.txt"):
+            if path.stem not in used:
+                path.unlink(missing_ok=True)
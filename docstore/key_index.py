@@ -0,0 +1,67 @@
+import base64
+import bisect
+from typing import Iterable, Optional
+
+
+def encode_cursor(key: str) -> str:
+    """Turns the last key of a page into an opaque cursor that is safe to
+    use as a URI path segment."""
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    padding = "=" * (-len(cursor) % 4)
+    try:
+        return base64.urlsafe_b64decode(cursor + padding).decode()
+    except ValueError:
+        raise ValueError(f"Invalid cursor {cursor!r}")
+
+
+class KeyIndex:
+    """Document ids kept in sorted order, so they can be listed a page at a
+    time and filtered by prefix with a binary search.
+
+    Cursors name the last key of the previous page rather than a position,
+    so pages stay consistent while documents are added or removed.
+    """
+
+    def __init__(self, keys: Iterable[str] = ()):
+        self._keys = sorted(set(keys))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        i = bisect.bisect_left(self._keys, key)
+        return i < len(self._keys) and self._keys[i] == key
+
+    def add(self, key: str) -> None:
+        if key not in self:
+            bisect.insort(self._keys, key)
+
+    def remove(self, key: str) -> None:
+        if key in self:
+            del self._keys[bisect.bisect_left(self._keys, key)]
+
+    def page(
+        self, prefix: str = "", after: Optional[str] = None, limit: int = 1000
+    ) -> tuple[list[str], Optional[str]]:
+        """Returns up to limit keys starting with prefix that sort after the
+        key after, and the key to pass as after for the next page, or None
+        if this is the last page."""
+        start = bisect.bisect_left(self._keys, prefix)
+        if after is not None:
+            start = max(start, bisect.bisect_right(self._keys, after))
+
+        # Keys sharing a prefix are contiguous, so stop at the first miss
+        keys = self._keys[start : start + limit + 1]
+        items = []
+        for key in keys:
+            if not key.startswith(prefix):
+                break
+            items.append(key)
+
+        if len(items) > limit:
+            items = items[:limit]
+            return items, items[-1]
+        return items, None
@@ -0,0 +1,40 @@
+from bisect import bisect_right
+
+
+class LineIndex:
+    """Start offset of every line in a text.
+
+    Built in one pass over the text, after which a line number can be turned
+    into a character offset in O(1) and an offset into a line in O(log n).
+    Lines are separated by "\\n" and numbered from 0.
+    """
+
+    def __init__(self, text: str):
+        starts = [0]
+        position = text.find("\n")
+        while position != -1:
+            starts.append(position + 1)
+            position = text.find("\n", position + 1)
+
+        self.size = len(text)
+        self._starts = starts
+
+    @property
+    def line_count(self) -> int:
+        # A trailing newline ends the last line rather than starting a new one
+        if self.size and self._starts[-1] == self.size:
+            return len(self._starts) - 1
+        return len(self._starts) if self.size else 0
+
+    def line_start(self, line: int) -> int:
+        """Offset of the first character of a line, or the text size for
+        lines past the end."""
+        if line < 0:
+            return 0
+        if line >= len(self._starts):
+            return self.size
+        return self._starts[line]
+
+    def line_at(self, offset: int) -> int:
+        """Line containing the character at offset."""
+        return max(bisect_right(self._starts, offset) - 1, 0)
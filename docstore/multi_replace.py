@@ -0,0 +1,35 @@
+import re
+
+
+class MultiPattern:
+    """Matches several literal strings in a single left-to-right pass.
+
+    The strings are compiled into one regular expression alternation,
+    longest first. The text is scanned left to right, so of two strings
+    that overlap the one starting first wins, and at each position the
+    longest string that matches there wins. Matches never overlap.
+    """
+
+    def __init__(self, patterns: list[str]):
+        if not patterns:
+            raise ValueError("At least one pattern is required")
+        if any(not pattern for pattern in patterns):
+            raise ValueError("Patterns must not be empty")
+        if len(set(patterns)) != len(patterns):
+            raise ValueError("Patterns must be unique")
+
+        self.patterns = patterns
+        self._indexes = {pattern: i for i, pattern in enumerate(patterns)}
+        self._regex = re.compile(
+            "|".join(
+                re.escape(pattern)
+                for pattern in sorted(patterns, key=len, reverse=True)
+            )
+        )
+
+    def find_all(self, text: str) -> list[tuple[int, int, int]]:
+        """Returns (start, end, pattern index) for every match, in order."""
+        return [
+            (match.start(), match.end(), self._indexes[match.group()])
+            for match in self._regex.finditer(text)
+        ]
@@ -0,0 +1,234 @@
+import random
+from typing import Iterator, Optional
+
+# Once materialized, a table with more pieces than this is collapsed back
+# into a single piece so long editing sessions don't fragment it
+MAX_PIECES = 1024
+
+
+class _Piece:
+    """A node of the piece tree: one span of a source string.
+
+    Nodes form an implicit treap ordered by position in the document, so
+    every node also tracks the length and piece count of its subtree.
+    """
+
+    __slots__ = (
+        "source",
+        "start",
+        "length",
+        "priority",
+        "left",
+        "right",
+        "size",
+        "count",
+    )
+
+    def __init__(self, source: str, start: int, length: int):
+        self.source = source
+        self.start = start
+        self.length = length
+        self.priority = random.random()
+        self.left: Optional[_Piece] = None
+        self.right: Optional[_Piece] = None
+        self.size = length
+        self.count = 1
+
+    def text(self) -> str:
+        return self.source[self.start : self.start + self.length]
+
+
+def _size(node: Optional[_Piece]) -> int:
+    return node.size if node else 0
+
+
+def _count(node: Optional[_Piece]) -> int:
+    return node.count if node else 0
+
+
+def _update(node: _Piece) -> _Piece:
+    node.size = _size(node.left) + node.length + _size(node.right)
+    node.count = _count(node.left) + 1 + _count(node.right)
+    return node
+
+
+def _merge(
+    left: Optional[_Piece], right: Optional[_Piece]
+) -> Optional[_Piece]:
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _update(left)
+    right.left = _merge(left, right.left)
+    return _update(right)
+
+
+def _split(node: Optional[_Piece], position: int):
+    """Splits a tree into the first position characters and the rest,
+    cutting a piece in two if position falls inside it."""
+    if node is None:
+        return None, None
+
+    left_size = _size(node.left)
+    if position <= left_size:
+        left, node.left = _split(node.left, position)
+        return left, _update(node)
+
+    if position >= left_size + node.length:
+        node.right, right = _split(
+            node.right, position - left_size - node.length
+        )
+        return _update(node), right
+
+    cut = position - left_size
+    tail = _Piece(node.source, node.start + cut, node.length - cut)
+    node.length = cut
+    right = node.right
+    node.right = None
+    return _update(node), _merge(tail, right)
+
+
+class PieceTable:
+    """Mutable text stored as a tree of spans over immutable strings.
+
+    Replacing, inserting or deleting a range costs O(log n) in the number
+    of pieces, independent of the document length, because no text is
+    copied. The full text is only built when text() is called and is
+    cached until the next edit.
+    """
+
+    def __init__(self, text: str = ""):
+        self._root: Optional[_Piece] = None
+        self._text: Optional[str] = None
+        self._reset(text)
+
+    def __len__(self) -> int:
+        return _size(self._root)
+
+    def __str__(self) -> str:
+        return self.text()
+
+    @property
+    def piece_count(self) -> int:
+        return _count(self._root)
+
+    def _pieces(self, node: Optional[_Piece]) -> Iterator[_Piece]:
+        stack = []
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node
+            node = node.right
+
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "".join(
+                piece.text() for piece in self._pieces(self._root)
+            )
+            if self.piece_count > MAX_PIECES:
+                self._reset(self._text)
+        return self._text
+
+    def slice(self, start: int, end: int) -> str:
+        """Returns text[start:end] without materializing the whole text."""
+        start = min(max(start, 0), len(self))
+        end = min(max(end, start), len(self))
+        if self._text is not None:
+            return self._text[start:end]
+
+        parts: list[str] = []
+        self._collect(self._root, start, end, parts)
+        return "".join(parts)
+
+    def _collect(
+        self, node: Optional[_Piece], start: int, end: int, parts: list[str]
+    ):
+        if node is None or start >= end:
+            return
+        left_size = _size(node.left)
+        if start < left_size:
+            self._collect(node.left, start, min(end, left_size), parts)
+
+        piece_start = max(start - left_size, 0)
+        piece_end = min(end - left_size, node.length)
+        if piece_start < piece_end:
+            offset = node.start
+            parts.append(
+                node.source[offset + piece_start : offset + piece_end]
+            )
+
+        right_start = left_size + node.length
+        if end > right_start:
+            self._collect(
+                node.right,
+                max(start - right_start, 0),
+                end - right_start,
+                parts,
+            )
+
+    def replace_range(self, start: int, end: int, text: str) -> None:
+        """Replaces the characters in [start, end) with text."""
+        if not 0 <= start <= end <= len(self):
+            raise IndexError(f"Range {start}:{end} is outside the document")
+
+        left, rest = _split(self._root, start)
+        _, right = _split(rest, end - start)
+        middle = _Piece(text, 0, len(text)) if text else None
+        self._root = _merge(_merge(left, middle), right)
+        self._text = None
+
+    def insert(self, position: int, text: str) -> None:
+        self.replace_range(position, position, text)
+
+    def delete(self, start: int, end: int) -> None:
+        self.replace_range(start, end, "")
+
+    def find_all(self, old: str, count: Optional[int] = None) -> list[int]:
+        """Offsets of non-overlapping occurrences of old, left to right."""
+        if not old:
+            return []
+        text = self.text()
+        positions = []
+        position = text.find(old)
+        while position != -1 and (count is None or len(positions) < count):
+            positions.append(position)
+            position = text.find(old, position + len(old))
+        return positions
+
+    def replace(self, old: str, new: str, count: Optional[int] = None) -> int:
+        """Replaces up to count occurrences of old with new, returning how
+        many were replaced."""
+        positions = self.find_all(old, count)
+        self.replace_spans(
+            [(position, position + len(old), new) for position in positions]
+        )
+        return len(positions)
+
+    def replace_spans(self, spans: list[tuple[int, int, str]]) -> None:
+        """Replaces several sorted, non-overlapping ranges at once. Offsets
+        refer to the text before any of the replacements."""
+        if len(spans) > MAX_PIECES // 2:
+            # Rebuilding the text in one pass is cheaper than that many splices
+            text = self.text()
+            parts = []
+            last = 0
+            for start, end, new in spans:
+                parts.append(text[last:start])
+                parts.append(new)
+                last = end
+            parts.append(text[last:])
+            self._reset("".join(parts))
+            return
+
+        # Right to left, so earlier offsets stay valid
+        for start, end, new in reversed(spans):
+            self.replace_range(start, end, new)
+
+    def _reset(self, text: str) -> None:
+        self._root = _Piece(text, 0, len(text)) if text else None
+        self._text = text
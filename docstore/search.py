@@ -0,0 +1,163 @@
+import re
+import math
+import heapq
+from collections import Counter
+
+from docstore.piece_table import PieceTable
+
+TOKEN_PATTERN = re.compile(r"\w+")
+NON_TOKEN_PATTERN = re.compile(r"\W")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class SearchIndex:
+    """Inverted index over a set of documents, ranked with BM25.
+
+    Documents are added, replaced and removed one at a time, and a search
+    only touches the postings of the query's terms.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> {doc_id: term frequency}
+        self._postings: dict[str, dict[str, int]] = {}
+        self._doc_terms: dict[str, Counter] = {}
+        self._doc_lengths: dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def add(self, doc_id: str, text: str) -> None:
+        """Indexes a document, replacing any previous version of it.
+
+        Only postings of terms whose frequency changed are touched.
+        """
+        old_terms = self._doc_terms.get(doc_id, Counter())
+        new_terms = Counter(tokenize(text))
+
+        for term in old_terms.keys() - new_terms.keys():
+            self._remove_posting(term, doc_id)
+        for term, frequency in new_terms.items():
+            if old_terms.get(term) != frequency:
+                self._postings.setdefault(term, {})[doc_id] = frequency
+
+        length = new_terms.total()
+        self._total_length += length - self._doc_lengths.get(doc_id, 0)
+        self._doc_terms[doc_id] = new_terms
+        self._doc_lengths[doc_id] = length
+
+    def update(self, doc_id: str, old_text: str, new_text: str) -> None:
+        """Applies a local edit to an indexed document, given the edited
+        region before and after the edit.
+
+        The region must start and end on token boundaries (see
+        token_bounds) for the term counts to stay exact.
+        """
+        delta = Counter(tokenize(new_text))
+        delta.subtract(tokenize(old_text))
+
+        terms = self._doc_terms[doc_id]
+        for term, change in delta.items():
+            if not change:
+                continue
+            frequency = terms[term] + change
+            if frequency > 0:
+                terms[term] = frequency
+                self._postings.setdefault(term, {})[doc_id] = frequency
+            else:
+                del terms[term]
+                self._remove_posting(term, doc_id)
+            self._doc_lengths[doc_id] += change
+            self._total_length += change
+
+    def remove(self, doc_id: str) -> None:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            self._remove_posting(term, doc_id)
+        self._total_length -= self._doc_lengths.pop(doc_id)
+
+    def _remove_posting(self, term: str, doc_id: str) -> None:
+        postings = self._postings[term]
+        del postings[doc_id]
+        if not postings:
+            del self._postings[term]
+
+    def search(self, query: str, limit: int = 5) -> list[tuple[str, float]]:
+        """Returns up to limit (doc_id, score) pairs, best match first."""
+        doc_count = len(self._doc_terms)
+        if not doc_count:
+            return []
+        average_length = self._total_length / doc_count or 1
+
+        scores: dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+
+            idf = math.log(
+                1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5)
+            )
+            for doc_id, frequency in postings.items():
+                length = self._doc_lengths[doc_id]
+                norm = self.k1 * (
+                    1 - self.b + self.b * length / average_length
+                )
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * (
+                    frequency * (self.k1 + 1) / (frequency + norm)
+                )
+
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+
+def make_snippet(text: str, query: str, width: int = 160) -> str:
+    """Returns the part of text around the first match of a query term."""
+    terms = set(tokenize(query))
+    if not terms:
+        return text[:width]
+
+    pattern = re.compile(
+        r"\b(" + "|".join(re.escape(term) for term in terms) + r")\b",
+        re.IGNORECASE,
+    )
+    match = pattern.search(text)
+    start = 0 if match is None else max(match.start() - width // 2, 0)
+    end = min(start + width, len(text))
+
+    snippet = " ".join(text[start:end].split())
+    if start > 0:
+        snippet = "..." + snippet
+    if end < len(text):
+        snippet += "..."
+    return snippet
+
+
+def token_bounds(
+    document: PieceTable, start: int, end: int, chunk: int = 64
+) -> tuple[int, int]:
+    """Widens [start, end) so that it does not cut through a token."""
+    while start > 0:
+        chunk_start = max(start - chunk, 0)
+        before = document.slice(chunk_start, start)
+        match = re.search(r"\W\w*\Z", before)
+        if match:
+            start = chunk_start + match.start() + 1
+            break
+        start = chunk_start
+
+    while end < len(document):
+        chunk_end = min(end + chunk, len(document))
+        match = NON_TOKEN_PATTERN.search(document.slice(end, chunk_end))
+        if match:
+            end += match.start()
+            break
+        end = chunk_end
+
+    return start, end
@@ -0,0 +1,17 @@
+import zlib
+
+
+def shard_of(doc_id: str, shards: int) -> int:
+    """Returns which of shards shards holds the document doc_id."""
+    return zlib.crc32(doc_id.encode()) % shards
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parses a shard given as "index/count", such as "0/2"."""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard {value!r}, expected index/count")
+    if not 0 <= index < count:
+        raise ValueError(f"Invalid shard {value!r}, index out of range")
+    return index, count
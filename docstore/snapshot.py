@@ -0,0 +1,138 @@
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Iterator, NamedTuple, Union
+
+MAGIC = b"DOCSNAP1"
+# magic, first WAL segment not covered by the snapshot, entry count, and
+# offsets of the index and of the doc ids
+_HEADER = struct.Struct("<8sQQQQ")
+# offset and size of the text in bytes, length in characters, version and
+# modified time
+_ENTRY = struct.Struct("<QQQQd")
+# Separates doc ids in the id block
+ID_SEPARATOR = "\0"
+
+
+class SnapshotText:
+    """The text of one document inside a memory-mapped snapshot."""
+
+    __slots__ = ("_buffer", "_offset", "_size")
+
+    def __init__(self, buffer: mmap.mmap, offset: int, size: int):
+        self._buffer = buffer
+        self._offset = offset
+        self._size = size
+
+    def raw(self) -> bytes:
+        return self._buffer[self._offset : self._offset + self._size]
+
+    def text(self) -> str:
+        return self.raw().decode()
+
+
+class SnapshotEntry(NamedTuple):
+    doc_id: str
+    # The document's text, or where to copy it from
+    content: Union[str, SnapshotText]
+    length: int
+    version: int
+    modified_at: float
+
+
+class Snapshot:
+    """A read-only snapshot of every document, memory-mapped so that
+    opening it only reads the index. Document texts are paged in by the
+    OS when they are first read.
+
+    The file holds a header, then the UTF-8 texts back to back, then a
+    fixed-size index entry per document, then the doc ids, so the index
+    can be decoded in bulk.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.wal_segment, self.count, index_offset, ids_offset = (
+            _HEADER.unpack_from(self._buffer, 0)
+        )
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a document snapshot")
+        self._index_offset = index_offset
+        self._ids_offset = ids_offset
+
+    def entries(self) -> Iterator[SnapshotEntry]:
+        if not self.count:
+            return
+        buffer = self._buffer
+        index = buffer[self._index_offset : self._ids_offset]
+        doc_ids = buffer[self._ids_offset :].decode().split(ID_SEPARATOR)
+        for doc_id, (offset, size, length, version, modified_at) in zip(
+            doc_ids, _ENTRY.iter_unpack(index)
+        ):
+            yield SnapshotEntry(
+                doc_id,
+                SnapshotText(buffer, offset, size),
+                length,
+                version,
+                modified_at,
+            )
+
+
+def write_snapshot(
+    path: Path, wal_segment: int, entries: list[SnapshotEntry]
+) -> None:
+    """Writes entries to a new snapshot at path, replacing it atomically
+    once the file is safely on disk."""
+    temp_path = path.with_suffix(".tmp")
+    index = bytearray()
+    doc_ids = []
+    with open(temp_path, "wb") as f:
+        f.write(bytes(_HEADER.size))
+        offset = _HEADER.size
+        for entry in entries:
+            if isinstance(entry.content, SnapshotText):
+                data = entry.content.raw()
+            else:
+                data = entry.content.encode()
+            f.write(data)
+
+            if ID_SEPARATOR in entry.doc_id:
+                raise ValueError(f"Doc id {entry.doc_id!r} cannot be stored")
+            doc_ids.append(entry.doc_id)
+            index += _ENTRY.pack(
+                offset,
+                len(data),
+                entry.length,
+                entry.version,
+                entry.modified_at,
+            )
+            offset += len(data)
+
+        f.write(index)
+        f.write(ID_SEPARATOR.join(doc_ids).encode())
+        f.seek(0)
+        f.write(
+            _HEADER.pack(
+                MAGIC, wal_segment, len(entries), offset, offset + len(index)
+            )
+        )
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temp_path, path)
+    sync_directory(path.parent)
+
+
+def sync_directory(directory: Path) -> None:
+    """Makes renames and new files in directory durable."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,333 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import suppress
+from pathlib import Path
+from typing import Optional
+
+from docstore.document import Document
+from docstore.snapshot import (
+    Snapshot,
+    SnapshotEntry,
+    sync_directory,
+    write_snapshot,
+)
+from docstore.wal import (
+    WriteAheadLog,
+    list_segments,
+    read_segment,
+    segment_path,
+)
+
+logger = logging.getLogger(__name__)
+
+# Log size after which the documents are compacted into a new snapshot
+SNAPSHOT_THRESHOLD = 64 * 1024 * 1024
+# Hashes of the files that stored documents were last read from
+SOURCES_NAME = "sources.json"
+
+
+def snapshot_path(directory: Path, wal_segment: int) -> Path:
+    return directory / f"snapshot-{wal_segment:08d}.snap"
+
+
+def list_snapshots(directory: Path) -> list[int]:
+    return sorted(
+        int(path.stem[9:]) for path in directory.glob("snapshot-*.snap")
+    )
+
+
+class DurableStore:
+    """Keeps a dict of documents on disk, so edits survive restarts.
+
+    The directory holds the latest snapshot of every document and a
+    write-ahead log of the changes made since. Each change is logged as
+    the splices it made to a document, by position, and an edit is only
+    acknowledged once its record is fsynced. When the log grows past
+    snapshot_threshold bytes, a new snapshot is written in the background
+    and the log segments it covers are deleted.
+
+    Snapshots are memory-mapped on startup and document texts are read
+    lazily, so a restart costs time proportional to the number of
+    documents rather than their size.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        snapshot_threshold: int = SNAPSHOT_THRESHOLD,
+    ):
+        self.directory = Path(directory)
+        self.snapshot_threshold = snapshot_threshold
+        self.docs: dict[str, Document] = {}
+        self.wal: Optional[WriteAheadLog] = None
+        # Snapshots stay open while documents may still read from them
+        self._snapshots: list[Snapshot] = []
+        self._logged_bytes = 0
+        self._snapshot_task: Optional[asyncio.Task] = None
+
+    def load(
+        self,
+        docs: dict[str, Document],
+        source_hashes: Optional[dict[str, str]] = None,
+    ) -> None:
+        """Restores the stored documents into docs, replacing any with the
+        same id. Documents in docs that were never stored are persisted.
+
+        source_hashes maps the ids of documents in docs that were read from
+        files to the hashes of those files. If a file changed since its
+        document was stored, the document in docs is kept instead and
+        logged as the stored document's next version.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        source_hashes = source_hashes or {}
+        sourced = {
+            doc_id: docs[doc_id] for doc_id in source_hashes if doc_id in docs
+        }
+        self.docs = docs
+        initial_ids = set(docs)
+        stored_ids: set[str] = set()
+
+        first_segment = 0
+        snapshot = self._open_latest_snapshot()
+        if snapshot is not None:
+            first_segment = snapshot.wal_segment
+            for entry in snapshot.entries():
+                docs[entry.doc_id] = Document.from_source(
+                    entry.content, entry.length, entry.version, entry.modified_at
+                )
+                stored_ids.add(entry.doc_id)
+
+        segments = [
+            segment
+            for segment in list_segments(self.directory)
+            if segment >= first_segment
+        ]
+        for segment in segments:
+            path = segment_path(self.directory, segment)
+            for record in read_segment(path):
+                self._apply(record, stored_ids)
+                stored_ids.add(record["doc_id"])
+            if path.stat().st_size == 0:
+                # Left by a run that made no edits
+                path.unlink()
+
+        # Never append after a possibly torn tail; start a fresh segment
+        next_segment = max([first_segment, *segments]) + 1
+        self.wal = WriteAheadLog(self.directory, next_segment)
+
+        # Documents stored before their file's hash was recorded are taken
+        # to be unchanged
+        stored_hashes = self._load_source_hashes()
+        self._replace_changed(
+            {
+                doc_id: document
+                for doc_id, document in sourced.items()
+                if doc_id in stored_ids
+                and stored_hashes.get(doc_id, source_hashes[doc_id])
+                != source_hashes[doc_id]
+            }
+        )
+        # Recorded only once the new versions are durable, so a crash in
+        # between replaces them again on the next start
+        hashes = {
+            doc_id: sha256
+            for doc_id, sha256 in {**stored_hashes, **source_hashes}.items()
+            if doc_id in docs
+        }
+        if hashes != stored_hashes:
+            self._save_source_hashes(hashes)
+
+        # Counted like bytes logged by this run, so a log that keeps
+        # growing across restarts is still compacted
+        self._logged_bytes = sum(
+            segment_path(self.directory, segment).stat().st_size
+            for segment in list_segments(self.directory)
+            if segment >= first_segment
+        )
+        if (
+            initial_ids - stored_ids
+            or self._logged_bytes >= self.snapshot_threshold
+        ):
+            self._logged_bytes = 0
+            write_snapshot(
+                snapshot_path(self.directory, next_segment),
+                next_segment,
+                self._capture(),
+            )
+            self._remove_before(next_segment)
+
+    def _replace_changed(self, changed: dict[str, Document]) -> None:
+        """Logs each document in changed as the next version of the stored
+        document with the same id, replacing its whole text."""
+        records = []
+        for doc_id, document in changed.items():
+            stored = self.docs[doc_id]
+            document.version = stored.version + 1
+            records.append(
+                {
+                    "op": "splice",
+                    "doc_id": doc_id,
+                    "spans": [(0, len(stored), document.text())],
+                    "version": document.version,
+                    "modified_at": document.modified_at,
+                }
+            )
+            self.docs[doc_id] = document
+            logger.info(
+                f"{doc_id} changed on disk, stored as version "
+                f"{document.version}"
+            )
+        if records:
+            self.wal.write(records)
+
+    def _load_source_hashes(self) -> dict[str, str]:
+        try:
+            with open(self.directory / SOURCES_NAME, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_source_hashes(self, hashes: dict[str, str]) -> None:
+        path = self.directory / SOURCES_NAME
+        temp_path = path.with_suffix(".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(hashes, f, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        sync_directory(self.directory)
+
+    def _open_latest_snapshot(self) -> Optional[Snapshot]:
+        for wal_segment in reversed(list_snapshots(self.directory)):
+            try:
+                snapshot = Snapshot(snapshot_path(self.directory, wal_segment))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping unreadable snapshot: {e}")
+                continue
+            self._snapshots.append(snapshot)
+            return snapshot
+        return None
+
+    def _apply(self, record: dict, stored_ids: set[str]) -> None:
+        """Replays a logged change. A record can also be covered by the
+        snapshot, if it was written while the snapshot was taken, so
+        changes the stored document already has are skipped."""
+        doc_id = record["doc_id"]
+        if record["op"] == "create":
+            if doc_id not in stored_ids:
+                self.docs[doc_id] = Document(
+                    record["text"], record["version"], record["modified_at"]
+                )
+            return
+
+        document = self.docs.get(doc_id)
+        if doc_id not in stored_ids or document.version >= record["version"]:
+            return
+        document.replace_spans([tuple(span) for span in record["spans"]])
+        document.version = record["version"]
+        document.modified_at = record["modified_at"]
+
+    async def log_create(self, doc_id: str, document: Document) -> None:
+        await self._log(
+            {
+                "op": "create",
+                "doc_id": doc_id,
+                "text": document.text(),
+                "version": document.version,
+                "modified_at": document.modified_at,
+            }
+        )
+
+    async def log_splices(
+        self,
+        doc_id: str,
+        spans: list[tuple[int, int, str]],
+        version: int,
+        modified_at: float,
+    ) -> None:
+        """Logs an edit that applies spans, with offsets into the text
+        before the edit, and brings the document to version.
+
+        Log an edit before applying it, so an edit that fails to be logged
+        never takes effect.
+        """
+        await self._log(
+            {
+                "op": "splice",
+                "doc_id": doc_id,
+                "spans": spans,
+                "version": version,
+                "modified_at": modified_at,
+            }
+        )
+
+    async def _log(self, record: dict) -> None:
+        self._logged_bytes += await self.wal.append(record)
+        if (
+            self._logged_bytes >= self.snapshot_threshold
+            and self._snapshot_task is None
+        ):
+            self._snapshot_task = asyncio.create_task(self.snapshot())
+
+    def _capture(self) -> list[SnapshotEntry]:
+        entries = []
+        for doc_id, document in self.docs.items():
+            # Unread documents are copied straight from the old snapshot
+            content = document.source or document.text()
+            entries.append(
+                SnapshotEntry(
+                    doc_id,
+                    content,
+                    len(document),
+                    document.version,
+                    document.modified_at,
+                )
+            )
+        return entries
+
+    async def snapshot(self) -> None:
+        """Compacts the log into a new snapshot without blocking edits."""
+        try:
+            started_at = time.perf_counter()
+            self._logged_bytes = 0
+            # Changes from here on go to the new segment and are replayed
+            # on top of the snapshot, or skipped if it already has them
+            wal_segment = await self.wal.rotate()
+            entries = self._capture()
+            await asyncio.to_thread(
+                write_snapshot,
+                snapshot_path(self.directory, wal_segment),
+                wal_segment,
+                entries,
+            )
+            self._remove_before(wal_segment)
+            logger.info(
+                f"Wrote snapshot of {len(entries)} documents in "
+                f"{time.perf_counter() - started_at:.2f}s"
+            )
+        except Exception as e:
+            logger.error(f"Error writing snapshot: {e}")
+        finally:
+            self._snapshot_task = None
+
+    def _remove_before(self, wal_segment: int) -> None:
+        for segment in list_segments(self.directory):
+            if segment < wal_segment:
+                segment_path(self.directory, segment).unlink(missing_ok=True)
+        for older in list_snapshots(self.directory):
+            if older < wal_segment:
+                # Documents may still read from the mapped file, which
+                # stays readable after unlinking; platforms that refuse
+                # are cleaned up on the next start
+                with suppress(OSError):
+                    snapshot_path(self.directory, older).unlink()
+        sync_directory(self.directory)
+
+    async def close(self) -> None:
+        if self._snapshot_task is not None:
+            await self._snapshot_task
+        if self.wal is not None:
+            await self.wal.close()
@@ -0,0 +1,69 @@
+from typing import Awaitable
+from weakref import WeakSet
+
+import anyio
+from mcp.server.session import ServerSession
+from pydantic import AnyUrl
+
+
+class Subscriptions:
+    """Tracks which client sessions to notify when resources change.
+
+    Sessions subscribe to individual resource URIs, and are told about
+    changes to the resource list once they have read it or subscribed to
+    anything. Sessions are held weakly and forgotten as soon as a
+    notification to them fails, so disconnected clients don't accumulate.
+    """
+
+    def __init__(self):
+        self._sessions: WeakSet[ServerSession] = WeakSet()
+        self._subscribers: dict[str, WeakSet[ServerSession]] = {}
+
+    def watch(self, session: ServerSession) -> None:
+        self._sessions.add(session)
+
+    def subscribe(self, uri: str, session: ServerSession) -> None:
+        self._subscribers.setdefault(uri, WeakSet()).add(session)
+        self.watch(session)
+
+    def unsubscribe(self, uri: str, session: ServerSession) -> None:
+        sessions = self._subscribers.get(uri)
+        if sessions is None:
+            return
+        sessions.discard(session)
+        if not sessions:
+            del self._subscribers[uri]
+
+    async def resource_updated(self, uri: str) -> None:
+        """Notifies sessions subscribed to uri or to any resource under it,
+        such as a range of the same document.
+
+        uri must have its path segments quoted. Only whole segments are
+        compared, so an update to docs://documents/a reaches neither
+        docs://documents/ab nor docs://documents/a%2Fb.
+        """
+        segments = uri.rstrip("/").split("/")
+        for subscribed_uri, sessions in list(self._subscribers.items()):
+            if subscribed_uri.split("/")[: len(segments)] != segments:
+                continue
+            for session in list(sessions):
+                await self._send(
+                    session, session.send_resource_updated(AnyUrl(subscribed_uri))
+                )
+
+    async def list_changed(self) -> None:
+        for session in list(self._sessions):
+            await self._send(session, session.send_resource_list_changed())
+
+    async def _send(
+        self, session: ServerSession, notification: Awaitable[None]
+    ) -> None:
+        try:
+            await notification
+        except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+            self._forget(session)
+
+    def _forget(self, session: ServerSession) -> None:
+        self._sessions.discard(session)
+        for uri in list(self._subscribers):
+            self.unsubscribe(uri, session)
@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import Iterator, Optional
+
+# Size and CRC-32 of the JSON payload that follows
+_FRAME = struct.Struct("<II")
+
+
+def segment_path(directory: Path, segment: int) -> Path:
+    return directory / f"wal-{segment:08d}.log"
+
+
+def list_segments(directory: Path) -> list[int]:
+    return sorted(int(path.stem[4:]) for path in directory.glob("wal-*.log"))
+
+
+def read_segment(path: Path) -> Iterator[dict]:
+    """Yields the records in a segment, stopping at the first incomplete or
+    corrupt frame, which can only be the tail of an interrupted write."""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    position = 0
+    while position + _FRAME.size <= len(data):
+        size, crc = _FRAME.unpack_from(data, position)
+        start = position + _FRAME.size
+        payload = data[start : start + size]
+        if len(payload) < size or zlib.crc32(payload) != crc:
+            return
+        yield json.loads(payload)
+        position = start + size
+
+
+def encode_record(record: dict) -> bytes:
+    payload = json.dumps(record, separators=(",", ":")).encode()
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+class WriteAheadLog:
+    """An append-only log of document changes, split into numbered segment
+    files so the part covered by a snapshot can be deleted.
+
+    Records are committed with group commit: while one batch is being
+    written and fsynced, newly appended records queue up and are written
+    together in the next batch, so concurrent edits share one fsync.
+
+    Once a batch fails to be written the log refuses every later record:
+    part of the failed batch may have reached the disk, so records logged
+    after it could be replayed onto the wrong text.
+    """
+
+    def __init__(self, directory: Path, segment: int):
+        self.directory = directory
+        self.segment = segment
+        self._file = open(segment_path(directory, segment), "ab")
+        self._pending: list[tuple[bytes, asyncio.Future]] = []
+        self._flusher: Optional[asyncio.Task] = None
+        # Held while a batch is written, so segments only switch between
+        # batches
+        self._lock = asyncio.Lock()
+        self._error: Optional[Exception] = None
+
+    def write(self, records: list[dict]) -> None:
+        """Writes records and waits for them to reach the disk."""
+        self._write(b"".join(encode_record(record) for record in records))
+
+    def _write(self, data: bytes) -> None:
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    async def append(self, record: dict) -> int:
+        """Appends record, returning once it is durable. The record is
+        queued before this first yields, so records are logged in the
+        order append() is called. Returns the record's size in bytes."""
+        self._check_error()
+        data = encode_record(record)
+        committed = asyncio.get_running_loop().create_future()
+        self._pending.append((data, committed))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush())
+        await committed
+        return len(data)
+
+    async def _flush(self) -> None:
+        while self._pending:
+            batch, self._pending = self._pending, []
+            try:
+                async with self._lock:
+                    self._check_error()
+                    await asyncio.to_thread(
+                        self._write, b"".join(data for data, _ in batch)
+                    )
+            except Exception as e:
+                if self._error is None:
+                    self._error = e
+                for _, committed in batch:
+                    if not committed.done():
+                        committed.set_exception(e)
+                continue
+
+            for _, committed in batch:
+                if not committed.done():
+                    committed.set_result(None)
+
+    def _check_error(self) -> None:
+        if self._error is not None:
+            raise OSError(
+                "Changes can't be logged until the server restarts, after "
+                f"an earlier write failed: {self._error}"
+            )
+
+    async def rotate(self) -> int:
+        """Starts a new segment for later records and returns its number."""
+        async with self._lock:
+            self._file.close()
+            self.segment += 1
+            self._file = open(segment_path(self.directory, self.segment), "ab")
+            return self.segment
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            await self._flusher
+        self._file.close()
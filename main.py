@@ -5,6 +5,7 @@ from dotenv import load_dotenv
 from contextlib import AsyncExitStack
 
 from mcp_client import MCPClient
+from mcp_client_pool import MCPClientPool
 from core.claude import Claude
 
 from core.cli_chat import CliChat
@@ -23,38 +24,129 @@ assert anthropic_api_key, (
 )
 
 
+async def start_clients(
+    stack: AsyncExitStack,
+    servers: dict[str, MCPClient],
+    timeout: float,
+) -> dict[str, MCPClient]:
+    """Launches and initializes all servers concurrently.
+
+    Servers that fail to start are reported and left out of the result.
+    """
+    clients = dict(servers)
+    for client in clients.values():
+        stack.push_async_callback(client.cleanup)
+
+    results = await asyncio.gather(
+        *(
+            asyncio.wait_for(client.connect(), timeout)
+            for client in clients.values()
+        ),
+        return_exceptions=True,
+    )
+
+    for client_id, result in zip(list(clients), results):
+        if isinstance(result, BaseException):
+            if isinstance(result, asyncio.TimeoutError):
+                result = f"no response after {timeout}s"
+            print(f"Error starting server {client_id}: {result}")
+            del clients[client_id]
+
+    if os.getenv("SHOW_STARTUP_TIMINGS", "0") == "1":
+        for client_id in servers:
+            client = clients.get(client_id)
+            if client is None:
+                print(f"[startup] {client_id}: failed")
+                continue
+            timings = client.startup_timings
+            print(
+                f"[startup] {client_id}: spawn {timings['spawn'] * 1000:.0f}ms,"
+                f" initialize {timings['initialize'] * 1000:.0f}ms"
+            )
+
+    return clients
+
+
 async def main():
     claude_service = Claude(model=claude_model)
 
     server_scripts = sys.argv[1:]
-    clients = {}
-
-    command, args = (
-        ("uv", ["run", "mcp_server.py"])
-        if os.getenv("USE_UV", "0") == "1"
-        else ("python", ["mcp_server.py"])
-    )
+    cache_bytes = int(os.getenv("RESOURCE_CACHE_BYTES", "0"))
+    # Read-only tools, which concurrent chats can share results of
+    coalesce_tools = ("read_doc_contents", "search_docs", "get_doc_metadata")
+    request_timeout = float(os.getenv("MCP_REQUEST_TIMEOUT", "120"))
+
+    if os.getenv("DOC_SERVER_TRANSPORT", "stdio") == "inprocess":
+        from mcp_server import mcp as doc_server
+
+        doc_client = MCPClient.in_process(
+            doc_server,
+            cache_bytes=cache_bytes,
+            coalesce_tools=coalesce_tools,
+            request_timeout=request_timeout,
+        )
+    else:
+        command, args = (
+            ("uv", ["run", "mcp_server.py"])
+            if os.getenv("USE_UV", "0") == "1"
+            else ("python", ["mcp_server.py"])
+        )
+        client_options = dict(
+            # stdio servers only inherit a few variables, so the document
+            # settings are passed on
+            env={
+                name: os.environ[name]
+                for name in ("DOCS_DIR", "DOCS_DATA_DIR")
+                if name in os.environ
+            },
+            cache_bytes=cache_bytes,
+            coalesce_tools=coalesce_tools,
+            request_timeout=request_timeout,
+        )
+        replicas = int(os.getenv("DOC_SERVER_REPLICAS", "1"))
+        if replicas > 1:
+            doc_client = MCPClientPool(
+                command=command, args=args, replicas=replicas, **client_options
+            )
+        else:
+            doc_client = MCPClient(command=command, args=args, **client_options)
+
+    servers = {"doc_client": doc_client}
+    for i, server_script in enumerate(server_scripts):
+        servers[f"client_{i}_{server_script}"] = MCPClient(
+            command="uv",
+            args=["run", server_script],
+            request_timeout=request_timeout,
+        )
 
     async with AsyncExitStack() as stack:
-        doc_client = await stack.enter_async_context(
-            MCPClient(command=command, args=args)
+        clients = await start_clients(
+            stack,
+            servers,
+            timeout=float(os.getenv("SERVER_STARTUP_TIMEOUT", "30")),
         )
-        clients["doc_client"] = doc_client
 
-        for i, server_script in enumerate(server_scripts):
-            client_id = f"client_{i}_{server_script}"
-            client = await stack.enter_async_context(
-                MCPClient(command="uv", args=["run", server_script])
-            )
-            clients[client_id] = client
+        doc_client = clients.get("doc_client")
+        if doc_client is None:
+            print("Error: the document server is required. Exiting.")
+            return
 
         chat = CliChat(
             doc_client=doc_client,
             clients=clients,
             claude_service=claude_service,
+            history_token_budget=int(
+                os.getenv("HISTORY_TOKEN_BUDGET", "100000")
+            ),
+            inline_token_budget=int(
+                os.getenv("INLINE_TOKEN_BUDGET", "20000")
+            ),
+            turn_timeout=float(os.getenv("TURN_TIMEOUT", "600")),
         )
 
-        cli = CliApp(chat)
+        stack.push_async_callback(Claude.close)
+
+        cli = CliApp(chat, show_usage=os.getenv("SHOW_USAGE", "0") == "1")
         await cli.initialize()
         await cli.run()
 
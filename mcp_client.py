@@ -1,13 +1,187 @@
 import sys
+import time
+import random
 import asyncio
-from typing import Optional, Any
-from contextlib import AsyncExitStack
+import inspect
+from collections import OrderedDict
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Optional,
+    TypeVar,
+    Union,
+)
+from contextlib import AsyncExitStack, suppress
+import anyio
 from mcp import ClientSession, StdioServerParameters, types
 from mcp.client.stdio import stdio_client
+from mcp.server.fastmcp import FastMCP
+from mcp.shared.exceptions import McpError
+from mcp.shared.memory import create_client_server_memory_streams
 
 import json
 from pydantic import AnyUrl
 
+ResourceNotification = Union[
+    types.ResourceUpdatedNotification, types.ResourceListChangedNotification
+]
+ResourceListener = Callable[[ResourceNotification], Optional[Awaitable[None]]]
+T = TypeVar("T")
+
+# Error code given to requests that were waiting on a server that went away
+CONNECTION_LOST = -32000
+
+
+class ConnectionLostError(ConnectionError):
+    """The connection to the server was lost. The client reconnects on its
+    own, so the request can be retried."""
+
+
+# The SDK's sessions keep no public record of their requests, so the two
+# functions below read private BaseSession state. Nothing else in the client
+# does. pyproject.toml caps mcp below 1.9; check both before raising it.
+
+
+def next_request_id(session: ClientSession) -> int:
+    """The id session gives the next request it sends, which is assigned
+    before sending first yields."""
+    return session._request_id
+
+
+def pending_responses(session: ClientSession) -> dict[Any, Any]:
+    """The response streams of the requests session is still waiting on,
+    by request id."""
+    return dict(session._response_streams)
+
+
+def root_cause(error: Exception) -> Exception:
+    """Unwraps the single-error exception groups that task groups wrap
+    errors in."""
+    while len(getattr(error, "exceptions", ())) == 1:
+        error = error.exceptions[0]
+    return error
+
+
+class ResourceCache:
+    """An LRU cache of parsed resource contents, bounded by the total size
+    of the raw contents in bytes.
+
+    Each entry may carry the version of the document it was read at, and
+    a lookup for a different version misses. Every invalidation bumps
+    generation, so a read that started before one can tell that its
+    result may already be stale.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = 0
+        # uri -> (value, size, version)
+        self._entries: OrderedDict[str, tuple[Any, int, Optional[int]]] = (
+            OrderedDict()
+        )
+
+    def get(self, uri: str, version: Optional[int] = None) -> tuple[bool, Any]:
+        """Returns (True, value) on a hit and (False, None) on a miss."""
+        entry = self._entries.get(uri)
+        if entry is None or (version is not None and entry[2] != version):
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(uri)
+        self.hits += 1
+        return True, entry[0]
+
+    def put(
+        self,
+        uri: str,
+        value: Any,
+        size: int,
+        version: Optional[int] = None,
+        generation: Optional[int] = None,
+    ) -> list[str]:
+        """Caches value, unless generation is given and the cache has been
+        invalidated since. Returns the uris evicted to make room."""
+        if size > self.max_bytes or (
+            generation is not None and generation != self.generation
+        ):
+            return []
+
+        self._remove(uri)
+        self._entries[uri] = (value, size, version)
+        self._size += size
+
+        evicted = []
+        while self._size > self.max_bytes:
+            old_uri, (_, old_size, _) = self._entries.popitem(last=False)
+            self._size -= old_size
+            self.evictions += 1
+            evicted.append(old_uri)
+        return evicted
+
+    def _remove(self, uri: str) -> None:
+        entry = self._entries.pop(uri, None)
+        if entry is not None:
+            self._size -= entry[1]
+
+    def invalidate(self, uri: str) -> None:
+        """Drops uri and every cached resource under it."""
+        self.generation += 1
+        prefix = uri.rstrip("/") + "/"
+        for cached_uri in list(self._entries):
+            if cached_uri == uri or cached_uri.startswith(prefix):
+                self._remove(cached_uri)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+        self._size = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._size,
+        }
+
+
+class ResourceEvents:
+    """Iterates over resource notifications as they arrive.
+
+    Notifications are queued from the moment it is created, not from the
+    first iteration, so none are lost in between. Call aclose() to stop
+    receiving them.
+    """
+
+    def __init__(
+        self,
+        add_listener: Callable[[ResourceListener], Callable[[], None]],
+    ):
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._remove: Optional[Callable[[], None]] = add_listener(
+            self._queue.put_nowait
+        )
+
+    def __aiter__(self) -> "ResourceEvents":
+        return self
+
+    async def __anext__(self) -> ResourceNotification:
+        if self._remove is None:
+            raise StopAsyncIteration
+        return await self._queue.get()
+
+    async def aclose(self) -> None:
+        if self._remove is not None:
+            self._remove()
+            self._remove = None
+
 
 class MCPClient:
     def __init__(
@@ -15,29 +189,366 @@ class MCPClient:
         command: str,
         args: list[str],
         env: Optional[dict] = None,
+        cache_bytes: int = 0,
+        coalesce_tools: Iterable[str] = (),
+        reconnect: bool = True,
+        reconnect_delay: float = 0.1,
+        max_reconnect_delay: float = 30.0,
+        request_timeout: Optional[float] = None,
     ):
         self._command = command
         self._args = args
         self._env = env
+        self._server: Optional[FastMCP] = None
         self._session: Optional[ClientSession] = None
-        self._exit_stack: AsyncExitStack = AsyncExitStack()
+        self._connection_task: Optional[asyncio.Task] = None
+        self._closing = asyncio.Event()
+        # Seconds spent spawning the server and on the MCP handshake
+        self.startup_timings: dict[str, float] = {}
+        # Bumped whenever the server's tool catalog or resource list may have
+        # changed, so callers caching list_tools() or resource listings know
+        # when to rebuild.
+        self.tools_version: int = 0
+        self.resources_version: int = 0
+        self._resource_listeners: list[ResourceListener] = []
+        self._background_tasks: set[asyncio.Task] = set()
+        self.server_capabilities: Optional[types.ServerCapabilities] = None
+        # Parsed read_resource() results, kept fresh by subscribing to each
+        # cached uri. Disabled when cache_bytes is 0.
+        self.resource_cache: Optional[ResourceCache] = (
+            ResourceCache(cache_bytes) if cache_bytes > 0 else None
+        )
+        self._subscribed_uris: set[str] = set()
+        # Tools without side effects, whose concurrent identical calls can
+        # share one request
+        self.coalesce_tools = frozenset(coalesce_tools)
+        # Requests in flight, with the number of callers waiting on each
+        self._in_flight: dict[tuple, tuple[asyncio.Task, list[int]]] = {}
+        # Bumped by anything that may change what a request returns, so
+        # later requests don't join ones sent before the change
+        self._epoch = 0
+        self.coalesced_requests = 0
+        # Whether to restart the server when the connection is lost, waiting
+        # a jittered, exponentially growing delay between attempts
+        self.reconnect = reconnect
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        # Uris the caller subscribed to, renewed after reconnecting
+        self._subscriptions: set[str] = set()
+        self._lost_at: Optional[float] = None
+        self._reconnect_attempts = 0
+        self.restarts = 0
+        self.failed_restarts = 0
+        # Seconds from losing the connection to being connected again
+        self.recovery_times: list[float] = []
+        # Longest wait for a tool call, resource read or prompt, in seconds
+        self.request_timeout = request_timeout
+
+    @classmethod
+    def in_process(
+        cls,
+        server: FastMCP,
+        cache_bytes: int = 0,
+        coalesce_tools: Iterable[str] = (),
+        request_timeout: Optional[float] = None,
+    ) -> "MCPClient":
+        """Creates a client for a FastMCP server running in this event loop.
+
+        Messages travel over in-memory streams instead of a subprocess pipe,
+        so there is no process to spawn and no stdio framing on each call.
+        """
+        client = cls(
+            command="",
+            args=[],
+            cache_bytes=cache_bytes,
+            coalesce_tools=coalesce_tools,
+            request_timeout=request_timeout,
+        )
+        client._server = server
+        return client
 
     async def connect(self):
+        """Starts the server and waits until its session is initialized.
+
+        The connection is owned by a background task, so clients can be
+        connected concurrently and closed in any order.
+        """
+        ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._closing = asyncio.Event()
+        self._connection_task = asyncio.create_task(self._run_connection(ready))
+        try:
+            await ready
+        except BaseException:
+            # Report why connecting failed rather than how teardown went
+            with suppress(Exception):
+                await self.cleanup()
+            raise
+
+    async def _run_connection(self, ready: asyncio.Future):
+        """Keeps the client connected until cleanup() is called, restarting
+        the server whenever the connection is lost."""
+        try:
+            while True:
+                try:
+                    await self._run_session(ready)
+                except Exception as e:
+                    e = root_cause(e)
+                    if not ready.done():
+                        ready.set_exception(e)
+                        return
+                    if not self.reconnect:
+                        raise
+                    # Raised when stopping a server that has already exited
+                    if not isinstance(e, ProcessLookupError):
+                        print(f"Error in connection to {self._describe()}: {e}")
+                finally:
+                    self._session = None
+
+                if self._closing.is_set() or not self.reconnect:
+                    return
+                if self._lost_at is None:
+                    self._lost_at = time.perf_counter()
+                if self._reconnect_attempts > 0:
+                    self.failed_restarts += 1
+
+                delay = min(
+                    self.max_reconnect_delay,
+                    self.reconnect_delay * 2**self._reconnect_attempts,
+                )
+                self._reconnect_attempts += 1
+                await asyncio.sleep(random.uniform(delay / 2, delay))
+        finally:
+            if not ready.done():
+                ready.cancel()
+
+    async def _run_session(self, ready: asyncio.Future):
+        """Connects once and stays connected until the client is closing or
+        the server goes away."""
+        async with AsyncExitStack() as stack:
+            started_at = time.perf_counter()
+            _stdio, _write = await self._open_transport(stack)
+
+            task_group = await stack.enter_async_context(
+                anyio.create_task_group()
+            )
+            stack.callback(task_group.cancel_scope.cancel)
+            disconnected = asyncio.Event()
+            _stdio = self._watch_transport(task_group, _stdio, disconnected)
+
+            session = await stack.enter_async_context(
+                ClientSession(_stdio, _write, message_handler=self._handle_message)
+            )
+            task_group.start_soon(
+                self._fail_requests_on_disconnect, session, disconnected
+            )
+            spawned_at = time.perf_counter()
+
+            initialized = await session.initialize()
+            self.server_capabilities = initialized.capabilities
+            self.startup_timings = {
+                "spawn": spawned_at - started_at,
+                "initialize": time.perf_counter() - spawned_at,
+            }
+
+            self._session = session
+            self.tools_version += 1
+            self.resources_version += 1
+            self._epoch += 1
+            # A new session starts with no subscriptions
+            self._subscribed_uris.clear()
+            if self.resource_cache is not None:
+                self.resource_cache.clear()
+            if self._lost_at is not None:
+                self._recovered()
+            if not ready.done():
+                ready.set_result(None)
+
+            closing = asyncio.ensure_future(self._closing.wait())
+            lost = asyncio.ensure_future(disconnected.wait())
+            try:
+                await asyncio.wait(
+                    {closing, lost}, return_when=asyncio.FIRST_COMPLETED
+                )
+            finally:
+                closing.cancel()
+                lost.cancel()
+            self._session = None
+            if not self._closing.is_set():
+                self._lost_at = time.perf_counter()
+
+    def _watch_transport(
+        self,
+        task_group: anyio.abc.TaskGroup,
+        source: anyio.abc.ObjectReceiveStream,
+        disconnected: asyncio.Event,
+    ) -> anyio.abc.ObjectReceiveStream:
+        """Returns a stream of the messages from source that sets
+        disconnected once source ends, meaning the server has gone away."""
+        send, receive = anyio.create_memory_object_stream(0)
+
+        async def forward():
+            try:
+                async with send:
+                    async for message in source:
+                        await send.send(message)
+            except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+                pass
+            finally:
+                disconnected.set()
+
+        task_group.start_soon(forward)
+        return receive
+
+    async def _fail_requests_on_disconnect(
+        self, session: ClientSession, disconnected: asyncio.Event
+    ) -> None:
+        """Fails the requests still awaiting a response once the server has
+        gone away. The session would otherwise leave them waiting forever."""
+        await disconnected.wait()
+        for request_id, stream in pending_responses(session).items():
+            error = types.JSONRPCError(
+                jsonrpc="2.0",
+                id=request_id,
+                error=types.ErrorData(
+                    code=CONNECTION_LOST,
+                    message="Connection to the server was lost",
+                ),
+            )
+            with suppress(
+                anyio.WouldBlock,
+                anyio.ClosedResourceError,
+                anyio.BrokenResourceError,
+            ):
+                stream.send_nowait(error)
+
+    def _recovered(self) -> None:
+        self.recovery_times.append(time.perf_counter() - self._lost_at)
+        self._lost_at = None
+        self._reconnect_attempts = 0
+        self.restarts += 1
+        for uri in self._subscriptions:
+            self._run_in_background(self._renew_subscription(uri))
+        # The restarted server may hold different resources
+        self._dispatch_resource_event(
+            types.ResourceListChangedNotification(
+                method="notifications/resources/list_changed"
+            )
+        )
+
+    async def _renew_subscription(self, uri: str) -> None:
+        try:
+            await self._request(lambda s: s.subscribe_resource(AnyUrl(uri)))
+        except Exception as e:
+            print(f"Error renewing subscription to {uri}: {e}")
+
+    def _describe(self) -> str:
+        if self._server is not None:
+            return self._server.name
+        return " ".join([self._command, *self._args])
+
+    def connection_stats(self) -> dict[str, Any]:
+        return {
+            "connected": self._session is not None,
+            "restarts": self.restarts,
+            "failed_restarts": self.failed_restarts,
+            "last_recovery_seconds": (
+                self.recovery_times[-1] if self.recovery_times else None
+            ),
+        }
+
+    async def _open_transport(self, stack: AsyncExitStack):
+        if self._server is not None:
+            return await self._open_in_process_transport(stack)
+
         server_params = StdioServerParameters(
             command=self._command,
             args=self._args,
             env=self._env,
         )
-        stdio_transport = await self._exit_stack.enter_async_context(
-            stdio_client(server_params)
+        return await stack.enter_async_context(stdio_client(server_params))
+
+    async def _open_in_process_transport(self, stack: AsyncExitStack):
+        client_streams, server_streams = await stack.enter_async_context(
+            create_client_server_memory_streams()
         )
-        _stdio, _write = stdio_transport
-        self._session = await self._exit_stack.enter_async_context(
-            ClientSession(_stdio, _write)
+        server_read, server_write = server_streams
+        server = self._server._mcp_server
+
+        task_group = await stack.enter_async_context(anyio.create_task_group())
+        # Stop the server before the task group waits on it
+        stack.callback(task_group.cancel_scope.cancel)
+        task_group.start_soon(
+            lambda: server.run(
+                server_read,
+                server_write,
+                server.create_initialization_options(),
+            )
         )
-        await self._session.initialize()
+        return client_streams
+
+    async def _handle_message(self, message) -> None:
+        if not isinstance(message, types.ServerNotification):
+            return
+
+        if isinstance(message.root, types.ToolListChangedNotification):
+            self.tools_version += 1
+        elif isinstance(message.root, types.ResourceListChangedNotification):
+            self.resources_version += 1
+            self._epoch += 1
+            if self.resource_cache is not None:
+                # Listings may be cached under any uri
+                self.resource_cache.clear()
+            self._dispatch_resource_event(message.root)
+        elif isinstance(message.root, types.ResourceUpdatedNotification):
+            self._epoch += 1
+            if self.resource_cache is not None:
+                self.resource_cache.invalidate(str(message.root.params.uri))
+            self._dispatch_resource_event(message.root)
+
+    def _dispatch_resource_event(self, notification: ResourceNotification):
+        for listener in list(self._resource_listeners):
+            try:
+                result = listener(notification)
+            except Exception as e:
+                print(f"Error in resource listener: {e}")
+                continue
+            if inspect.isawaitable(result):
+                # Run it outside the receive loop, so the listener can make
+                # requests on this session without deadlocking
+                self._run_in_background(result)
+
+    def _run_in_background(self, awaitable: Awaitable) -> None:
+        task = asyncio.ensure_future(awaitable)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def add_resource_listener(
+        self, listener: ResourceListener
+    ) -> Callable[[], None]:
+        """Calls listener with every resources/updated and
+        resources/list_changed notification from the server.
+
+        The listener may be a plain function or a coroutine function.
+        Returns a function that removes the listener again.
+        """
+        self._resource_listeners.append(listener)
+
+        def remove():
+            with suppress(ValueError):
+                self._resource_listeners.remove(listener)
+
+        return remove
+
+    def resource_events(self) -> ResourceEvents:
+        """Returns an iterator over resource notifications from the
+        server, starting now."""
+        return ResourceEvents(self.add_resource_listener)
 
     def session(self) -> ClientSession:
+        if self._session is None and self._lost_at is not None:
+            raise ConnectionLostError(
+                f"Reconnecting to {self._describe()}, try again shortly"
+            )
         if self._session is None:
             raise ConnectionError(
                 "Client session not initialized or cache not populated. Call connect_to_server first."
@@ -66,35 +577,292 @@ class MCPClient:
     #     # TODO: Read a resource, parse the contents and return it
     #     return []
 
+    async def _request(self, send: Callable[[ClientSession], Awaitable[T]]) -> T:
+        """Sends a request on the current session, reporting a lost
+        connection as ConnectionLostError. If the caller stops waiting, the
+        server is told to cancel the request."""
+        session = self.session()
+        request_id = next_request_id(session)
+        try:
+            return await send(session)
+        except asyncio.CancelledError:
+            self._cancel_in_background(session, request_id)
+            raise
+        except McpError as e:
+            if e.error.code != CONNECTION_LOST:
+                raise
+            raise ConnectionLostError(e.error.message) from e
+        except (anyio.ClosedResourceError, anyio.BrokenResourceError) as e:
+            raise ConnectionLostError(
+                "Connection to the server was lost"
+            ) from e
+
+    def _cancel_in_background(
+        self, session: ClientSession, request_id: int
+    ) -> None:
+        notification = types.ClientNotification(
+            types.CancelledNotification(
+                method="notifications/cancelled",
+                params=types.CancelledNotificationParams(
+                    requestId=request_id,
+                    reason="The client stopped waiting for a response",
+                ),
+            )
+        )
+
+        async def cancel():
+            with suppress(Exception):
+                await session.send_notification(notification)
+
+        self._run_in_background(cancel())
+
+    async def _with_timeout(
+        self,
+        request: Awaitable[T],
+        timeout: Optional[float],
+        description: str,
+    ) -> T:
+        """Awaits request for at most timeout seconds, or request_timeout if
+        that is sooner, raising TimeoutError once it has been cancelled."""
+        timeout = min(
+            (t for t in (timeout, self.request_timeout) if t is not None),
+            default=None,
+        )
+        if timeout is None:
+            return await request
+        timeout = max(timeout, 0)
+        try:
+            return await asyncio.wait_for(request, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(
+                f"{description} timed out after {timeout:.1f}s"
+            ) from None
+
+    async def _coalesce(
+        self, key: tuple, request: Callable[[], Awaitable[T]]
+    ) -> T:
+        """Sends request, or if an identical one is already in flight, waits
+        for its result instead. The request is only cancelled once every
+        caller waiting on it has been."""
+        entry = self._in_flight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(request())
+            entry = (task, [0])
+            self._in_flight[key] = entry
+            task.add_done_callback(lambda _: self._request_done(key, task))
+        else:
+            self.coalesced_requests += 1
+
+        task, waiters = entry
+        waiters[0] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            waiters[0] -= 1
+            if waiters[0] == 0:
+                task.cancel()
+            raise
+
+    def _request_done(self, key: tuple, task: asyncio.Task) -> None:
+        entry = self._in_flight.get(key)
+        if entry is not None and entry[0] is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Marks the error as retrieved, in case no caller is left
+            task.exception()
+
     async def list_tools(self) -> list[types.Tool]:
-        result = await self.session().list_tools()
+        result = await self._coalesce(
+            ("list_tools", self.tools_version),
+            lambda: self._request(lambda s: s.list_tools()),
+        )
         return result.tools
 
     async def call_tool(
+        self, tool_name: str, tool_input, timeout: Optional[float] = None
+    ) -> types.CallToolResult | None:
+        return await self._with_timeout(
+            self._call_tool(tool_name, tool_input),
+            timeout,
+            f"Tool {tool_name}",
+        )
+
+    async def _call_tool(
         self, tool_name: str, tool_input
     ) -> types.CallToolResult | None:
-        return await self.session().call_tool(tool_name, tool_input)
+        if tool_name not in self.coalesce_tools:
+            try:
+                return await self._request(
+                    lambda s: s.call_tool(tool_name, tool_input)
+                )
+            finally:
+                self._epoch += 1
+
+        key = (
+            "call_tool",
+            tool_name,
+            json.dumps(tool_input, sort_keys=True, default=str),
+            self._epoch,
+        )
+        return await self._coalesce(
+            key,
+            lambda: self._request(lambda s: s.call_tool(tool_name, tool_input)),
+        )
 
     async def list_prompts(self) -> list[types.Prompt]:
-        result = await self.session().list_prompts()
+        result = await self._coalesce(
+            ("list_prompts", self._epoch),
+            lambda: self._request(lambda s: s.list_prompts()),
+        )
         return result.prompts
 
-    async def get_prompt(self, prompt_name, args: dict[str, str]):
-        result = await self.session().get_prompt(prompt_name, args)
+    async def get_prompt(
+        self,
+        prompt_name,
+        args: dict[str, str],
+        timeout: Optional[float] = None,
+    ):
+        result = await self._with_timeout(
+            self._request(lambda s: s.get_prompt(prompt_name, args)),
+            timeout,
+            f"Prompt {prompt_name}",
+        )
         return result.messages
 
-    async def read_resource(self, uri: str) -> Any:
-        result = await self.session().read_resource(AnyUrl(uri))
+    async def read_resource(
+        self,
+        uri: str,
+        version: Optional[int] = None,
+        use_cache: bool = True,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """Reads a resource, parsing JSON contents.
+
+        With the resource cache enabled, a cached copy is returned if there
+        is one, and if version is given, only if it was read at that
+        version. Cached values are shared, so callers must not mutate them.
+        Concurrent reads of the same uri share one request.
+        """
+        cache = self.resource_cache if use_cache else None
+        if cache is None:
+            result = await self._fetch_resource(uri, timeout)
+            return self._parse_resource(result.contents[0])
+
+        hit, value = cache.get(uri, version)
+        if hit:
+            return value
+
+        generation = cache.generation
+        self._subscribe_in_background(uri)
+        result = await self._fetch_resource(uri, timeout)
         resource = result.contents[0]
+        value = self._parse_resource(resource)
+        if isinstance(resource, types.TextResourceContents):
+            if version is None and isinstance(value, dict):
+                version = value.get("version")
+            evicted = cache.put(
+                uri,
+                value,
+                len(resource.text.encode()),
+                version,
+                generation,
+            )
+            for evicted_uri in evicted:
+                self._unsubscribe_in_background(evicted_uri)
+        return value
+
+    async def _fetch_resource(
+        self, uri: str, timeout: Optional[float] = None
+    ) -> types.ReadResourceResult:
+        return await self._with_timeout(
+            self._coalesce(
+                ("read_resource", uri, self._epoch),
+                lambda: self._request(lambda s: s.read_resource(AnyUrl(uri))),
+            ),
+            timeout,
+            f"Reading {uri}",
+        )
 
+    def _parse_resource(self, resource) -> Any:
         if isinstance(resource, types.TextResourceContents):
             if resource.mimeType == "application/json":
                 return json.loads(resource.text)
 
             return resource.text
 
+    def _subscribe_in_background(self, uri: str) -> None:
+        """Subscribes to a cached uri, so the server reports changes to it.
+        The request is sent ahead of the read it accompanies."""
+        capabilities = self.server_capabilities
+        if (
+            uri in self._subscribed_uris
+            or capabilities is None
+            or capabilities.resources is None
+            or not capabilities.resources.subscribe
+        ):
+            return
+        self._subscribed_uris.add(uri)
+
+        async def subscribe():
+            try:
+                await self._request(lambda s: s.subscribe_resource(AnyUrl(uri)))
+            except Exception:
+                self._subscribed_uris.discard(uri)
+
+        self._run_in_background(subscribe())
+
+    def _unsubscribe_in_background(self, uri: str) -> None:
+        if uri not in self._subscribed_uris:
+            return
+        self._subscribed_uris.discard(uri)
+        if uri in self._subscriptions:
+            # Still wanted by the caller
+            return
+
+        async def unsubscribe():
+            with suppress(Exception):
+                await self._request(
+                    lambda s: s.unsubscribe_resource(AnyUrl(uri))
+                )
+
+        self._run_in_background(unsubscribe())
+
+    async def read_resource_pages(self, uri: str) -> AsyncIterator[Any]:
+        """Reads a paginated resource one page at a time.
+
+        Each page is fetched only when the caller asks for it, by following
+        the "next" URI of the previous page until it is None.
+        """
+        next_uri: Optional[str] = uri
+        while next_uri is not None:
+            page = await self.read_resource(next_uri)
+            yield page
+            next_uri = page.get("next")
+
+    async def subscribe_resource(self, uri: str) -> None:
+        """Asks the server to send resources/updated notifications for uri."""
+        self._subscriptions.add(uri)
+        await self._request(lambda s: s.subscribe_resource(AnyUrl(uri)))
+
+    async def unsubscribe_resource(self, uri: str) -> None:
+        self._subscriptions.discard(uri)
+        await self._request(lambda s: s.unsubscribe_resource(AnyUrl(uri)))
+
     async def cleanup(self):
-        await self._exit_stack.aclose()
+        task = self._connection_task
+        self._connection_task = None
+        if task is None:
+            return
+
+        self._closing.set()
+        if self._session is None:
+            # Still starting up, so nothing is waiting on _closing
+            task.cancel()
+        try:
+            await task
+        except BaseException:
+            if not task.cancelled():
+                raise
         self._session = None
 
     async def __aenter__(self):
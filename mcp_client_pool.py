@@ -0,0 +1,391 @@
+import asyncio
+import json
+from contextlib import suppress
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, TypeVar
+from urllib.parse import quote, unquote
+
+from mcp import ClientSession, types
+
+from docstore.key_index import decode_cursor, encode_cursor
+from docstore.shards import shard_of
+from mcp_client import MCPClient, ResourceEvents, ResourceListener
+
+T = TypeVar("T")
+
+DOCUMENT_LIST_URI = "docs://documents"
+DOCUMENT_URI_PREFIX = "docs://documents/"
+# Path segments under DOCUMENT_URI_PREFIX that aren't document ids
+LISTING_SEGMENTS = {"page", "prefix", "metadata"}
+# Environment variable telling each replica which shard it serves
+SHARD_ENV = "DOCS_SHARD"
+
+
+def document_key(uri: str) -> Optional[str]:
+    """Returns the id of the document a resource uri refers to, if any."""
+    if not uri.startswith(DOCUMENT_URI_PREFIX):
+        return None
+    segment = uri[len(DOCUMENT_URI_PREFIX) :].split("/", 1)[0]
+    if not segment or segment in LISTING_SEGMENTS:
+        return None
+    return unquote(segment)
+
+
+def merge_pages(uri: str, pages: list[dict]) -> dict:
+    """Merges the pages each shard returned for the same listing uri.
+
+    A shard's page covers the ids up to its last one, so together the
+    pages cover every id up to the first page's end, which is where the
+    merged page ends.
+    """
+    ends = [
+        decode_cursor(page["next_cursor"])
+        for page in pages
+        if page["next_cursor"] is not None
+    ]
+    end = min(ends, default=None)
+    items = sorted(
+        item
+        for page in pages
+        for item in page["items"]
+        if end is None or item <= end
+    )
+
+    next_cursor = next_uri = None
+    if end is not None:
+        next_cursor = encode_cursor(end)
+        next_uri = f"{uri.rsplit('/', 1)[0]}/{next_cursor}"
+    return {"items": items, "next_cursor": next_cursor, "next": next_uri}
+
+
+def merge_metadata(doc_ids: list[str], results: list[dict]) -> dict:
+    """Merges metadata the shards returned for parts of doc_ids."""
+    found = {
+        doc["doc_id"]: doc for result in results for doc in result["documents"]
+    }
+    return {
+        "documents": [found[doc_id] for doc_id in doc_ids if doc_id in found],
+        "missing": [doc_id for doc_id in doc_ids if doc_id not in found],
+    }
+
+
+def merge_ranked(rankings: list[list[dict]], limit: int) -> list[dict]:
+    """Merges the search matches each shard returned, best first, by
+    taking every shard's first match, then every shard's second, and so
+    on. Scores are only used to order matches of the same rank: each
+    shard scores against its own corpus statistics, so scores from
+    different shards are not comparable."""
+    merged = []
+    for rank in range(max(map(len, rankings), default=0)):
+        tier = [ranking[rank] for ranking in rankings if rank < len(ranking)]
+        tier.sort(key=lambda match: match["score"], reverse=True)
+        merged += tier
+    return merged[:limit]
+
+
+def json_content(value: Any) -> types.TextContent:
+    """Serializes value the way FastMCP returns tool results."""
+    return types.TextContent(type="text", text=json.dumps(value, indent=2))
+
+
+class MCPClientPool:
+    """Runs several replicas of the document server, each behind its own
+    MCPClient, and spreads calls across them.
+
+    The documents are sharded across the replicas by a hash of their ids.
+    Each replica is started with DOCS_SHARD set to its shard, and only
+    holds, ingests and stores the documents of that shard. Every call
+    naming a document (a doc_id argument or a document uri) goes to the
+    replica holding it. Listings, metadata and searches are sent to every
+    replica that may hold a match, and their results merged. Search
+    results are merged by their rank within each shard, so the overall
+    ranking is approximate. Any other
+    call goes to the replica with the fewest requests outstanding, so
+    CPU-heavy tools run in parallel.
+
+    The pool has the same API as MCPClient.
+    """
+
+    def __init__(
+        self,
+        command: str,
+        args: list[str],
+        env: Optional[dict] = None,
+        replicas: int = 2,
+        **client_options,
+    ):
+        if replicas < 1:
+            raise ValueError("A pool needs at least one replica")
+        self.replicas = [
+            MCPClient(
+                command,
+                args,
+                {**(env or {}), SHARD_ENV: f"{index}/{replicas}"},
+                **client_options,
+            )
+            for index in range(replicas)
+        ]
+        self._outstanding = [0] * replicas
+
+    @property
+    def tools_version(self) -> int:
+        # Each replica's version only ever increases, so the sum changes
+        # whenever any of them does
+        return sum(replica.tools_version for replica in self.replicas)
+
+    @property
+    def resources_version(self) -> int:
+        return sum(replica.resources_version for replica in self.replicas)
+
+    @property
+    def startup_timings(self) -> dict[str, float]:
+        """The slowest replica's timings, since the pool waits for all."""
+        timings: dict[str, float] = {}
+        for replica in self.replicas:
+            for step, seconds in replica.startup_timings.items():
+                timings[step] = max(timings.get(step, 0.0), seconds)
+        return timings
+
+    def connection_stats(self) -> dict[str, Any]:
+        stats = [replica.connection_stats() for replica in self.replicas]
+        recoveries = [
+            s["last_recovery_seconds"]
+            for s in stats
+            if s["last_recovery_seconds"] is not None
+        ]
+        return {
+            "connected": all(s["connected"] for s in stats),
+            "restarts": sum(s["restarts"] for s in stats),
+            "failed_restarts": sum(s["failed_restarts"] for s in stats),
+            "last_recovery_seconds": max(recoveries, default=None),
+        }
+
+    async def connect(self):
+        try:
+            await asyncio.gather(
+                *(replica.connect() for replica in self.replicas)
+            )
+        except BaseException:
+            with suppress(Exception):
+                await self.cleanup()
+            raise
+
+    async def cleanup(self):
+        results = await asyncio.gather(
+            *(replica.cleanup() for replica in self.replicas),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    def _pick(self, key: Optional[str]) -> int:
+        if key is not None:
+            return shard_of(key, len(self.replicas))
+        return min(
+            range(len(self.replicas)), key=self._outstanding.__getitem__
+        )
+
+    async def _call(
+        self, index: int, call: Callable[[MCPClient], Awaitable[T]]
+    ) -> T:
+        self._outstanding[index] += 1
+        try:
+            return await call(self.replicas[index])
+        finally:
+            self._outstanding[index] -= 1
+
+    async def _route(
+        self,
+        key: Optional[str],
+        call: Callable[[MCPClient], Awaitable[T]],
+    ) -> T:
+        return await self._call(self._pick(key), call)
+
+    async def _fan_out(
+        self, call: Callable[[MCPClient], Awaitable[T]]
+    ) -> list[T]:
+        return list(
+            await asyncio.gather(
+                *(
+                    self._call(index, call)
+                    for index in range(len(self.replicas))
+                )
+            )
+        )
+
+    def _by_shard(self, doc_ids: list[str]) -> dict[int, list[str]]:
+        shards: dict[int, list[str]] = {}
+        for doc_id in dict.fromkeys(doc_ids):
+            shards.setdefault(self._pick(doc_id), []).append(doc_id)
+        return shards
+
+    def session(self) -> ClientSession:
+        return self.replicas[self._pick(None)].session()
+
+    async def list_tools(self) -> list[types.Tool]:
+        return await self._route(None, lambda replica: replica.list_tools())
+
+    async def call_tool(
+        self, tool_name: str, tool_input, timeout: Optional[float] = None
+    ) -> types.CallToolResult | None:
+        if tool_name == "search_docs":
+            return await self._search(tool_input, timeout)
+        if tool_name == "get_doc_metadata":
+            return await self._get_metadata(tool_input, timeout)
+
+        key = tool_input.get("doc_id") if isinstance(tool_input, dict) else None
+        return await self._route(
+            key,
+            lambda replica: replica.call_tool(tool_name, tool_input, timeout),
+        )
+
+    async def _search(
+        self, tool_input: dict, timeout: Optional[float]
+    ) -> types.CallToolResult | None:
+        """Searches every shard and interleaves their best matches."""
+        results = await self._fan_out(
+            lambda replica: replica.call_tool(
+                "search_docs", tool_input, timeout
+            )
+        )
+        for result in results:
+            if result is None or result.isError:
+                return result
+
+        rankings = [
+            [
+                json.loads(item.text)
+                for item in result.content
+                if isinstance(item, types.TextContent)
+            ]
+            for result in results
+        ]
+        matches = merge_ranked(rankings, tool_input.get("limit", 5))
+        return types.CallToolResult(
+            content=[json_content(match) for match in matches]
+        )
+
+    async def _get_metadata(
+        self, tool_input: dict, timeout: Optional[float]
+    ) -> types.CallToolResult | None:
+        """Asks each shard about its own documents."""
+        doc_ids = tool_input.get("doc_ids") or []
+        shards = self._by_shard(doc_ids)
+        results = await asyncio.gather(
+            *(
+                self._call(
+                    index,
+                    lambda replica, ids=ids: replica.call_tool(
+                        "get_doc_metadata", {"doc_ids": ids}, timeout
+                    ),
+                )
+                for index, ids in shards.items()
+            )
+        )
+        for result in results:
+            if result is None or result.isError:
+                return result
+
+        metadata = merge_metadata(
+            doc_ids, [json.loads(result.content[0].text) for result in results]
+        )
+        return types.CallToolResult(content=[json_content(metadata)])
+
+    async def list_prompts(self) -> list[types.Prompt]:
+        return await self._route(None, lambda replica: replica.list_prompts())
+
+    async def get_prompt(
+        self,
+        prompt_name,
+        args: dict[str, str],
+        timeout: Optional[float] = None,
+    ):
+        return await self._route(
+            args.get("doc_id"),
+            lambda replica: replica.get_prompt(prompt_name, args, timeout),
+        )
+
+    async def read_resource(self, uri: str, **options) -> Any:
+        key = document_key(uri)
+        if key is not None or not (
+            uri == DOCUMENT_LIST_URI or uri.startswith(DOCUMENT_URI_PREFIX)
+        ):
+            return await self._route(
+                key, lambda replica: replica.read_resource(uri, **options)
+            )
+
+        segment = uri[len(DOCUMENT_URI_PREFIX) :].split("/", 1)[0]
+        if segment == "metadata":
+            return await self._read_metadata(uri, options)
+
+        results = await self._fan_out(
+            lambda replica: replica.read_resource(uri, **options)
+        )
+        if uri == DOCUMENT_LIST_URI:
+            return [doc_id for doc_ids in results for doc_id in doc_ids]
+        return merge_pages(uri, results)
+
+    async def _read_metadata(self, uri: str, options: dict) -> dict:
+        doc_ids = [
+            unquote(doc_id) for doc_id in uri.rsplit("/", 1)[1].split(",")
+        ]
+        shards = self._by_shard(doc_ids)
+        results = await asyncio.gather(
+            *(
+                self._call(
+                    index,
+                    lambda replica, ids=ids: replica.read_resource(
+                        DOCUMENT_URI_PREFIX
+                        + "metadata/"
+                        + ",".join(quote(doc_id, safe="") for doc_id in ids),
+                        **options,
+                    ),
+                )
+                for index, ids in shards.items()
+            )
+        )
+        return merge_metadata(doc_ids, list(results))
+
+    async def read_resource_pages(self, uri: str) -> AsyncIterator[Any]:
+        """Reads a paginated resource one merged page at a time. Cursors
+        name the last id of a page, so every shard can continue from one."""
+        next_uri: Optional[str] = uri
+        while next_uri is not None:
+            page = await self.read_resource(next_uri)
+            yield page
+            next_uri = page.get("next")
+
+    async def subscribe_resource(self, uri: str) -> None:
+        await asyncio.gather(
+            *(replica.subscribe_resource(uri) for replica in self.replicas)
+        )
+
+    async def unsubscribe_resource(self, uri: str) -> None:
+        await asyncio.gather(
+            *(replica.unsubscribe_resource(uri) for replica in self.replicas)
+        )
+
+    def add_resource_listener(
+        self, listener: ResourceListener
+    ) -> Callable[[], None]:
+        """Calls listener with resource notifications from every replica."""
+        removers = [
+            replica.add_resource_listener(listener)
+            for replica in self.replicas
+        ]
+
+        def remove():
+            for remover in removers:
+                remover()
+
+        return remove
+
+    def resource_events(self) -> ResourceEvents:
+        return ResourceEvents(self.add_resource_listener)
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.cleanup()
@@ -1,15 +1,29 @@
 from mcp.server.fastmcp import FastMCP
 
+from docstore.document import Document
+
 mcp = FastMCP("DocumentMCP", log_level="ERROR")
 
 
 docs = {
-    "deposition.md": "This deposition covers the testimony of Angela Smith, P.E.",
-    "report.pdf": "The report details the state of a 20m condenser tower.",
-    "financials.docx": "These financials outline the project's budget and expenditures.",
-    "outlook.pdf": "This document presents the projected future performance of the system.",
-    "plan.md": "The plan outlines the steps for the project's implementation.",
-    "spec.txt": "These specifications define the technical requirements for the equipment.",
+    "deposition.md": Document(
+        "This deposition covers the testimony of Angela Smith, P.E."
+    ),
+    "report.pdf": Document(
+        "The report details the state of a 20m condenser tower."
+    ),
+    "financials.docx": Document(
+        "These financials outline the project's budget and expenditures."
+    ),
+    "outlook.pdf": Document(
+        "This document presents the projected future performance of the system."
+    ),
+    "plan.md": Document(
+        "The plan outlines the steps for the project's implementation."
+    ),
+    "spec.txt": Document(
+        "These specifications define the technical requirements for the equipment."
+    ),
 }
 
 # TODO: Write a tool to read a doc
@@ -20,28 +34,371 @@ docs = {
 # TODO: Write a prompt to summarize a doc
 
 
-from pydantic import Field
+from pydantic import BaseModel, Field
 from mcp.server.fastmcp.prompts import base
 
+import os
+import time
+import logging
+import asyncio
+import multiprocessing
+from collections import defaultdict
+from contextlib import suppress
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote, unquote
+
+import anyio
+from mcp.server.lowlevel import NotificationOptions, Server
+from mcp.server.session import ServerSession
+from mcp.shared.session import RequestResponder
+from pydantic import AnyUrl
+
+from docstore.ingest import CACHE_DIR_NAME, Ingester
+from docstore.key_index import KeyIndex, decode_cursor, encode_cursor
+from docstore.multi_replace import MultiPattern
+from docstore.search import SearchIndex, make_snippet, token_bounds
+from docstore.shards import parse_shard, shard_of
+from docstore.store import DurableStore
+from docstore.subscriptions import Subscriptions
+
+# The server logs only errors, but skipped files and unreadable snapshots
+# should still be reported on stderr
+logging.getLogger("docstore").setLevel(logging.WARNING)
+
+# Largest slice of a document returned by one ranged read
+DEFAULT_PAGE_SIZE = 64 * 1024
+# Number of document ids in one page of the document listing
+LIST_PAGE_SIZE = 1000
+# Cursor naming the first page of the document listing
+FIRST_PAGE = "start"
+
+# A replica started by MCPClientPool is given its shard as "index/count" in
+# DOCS_SHARD, and only serves the documents whose ids hash to that shard.
+# Each shard keeps its own ingest cache and data directory, so changing the
+# number of replicas starts every shard from the documents on disk again.
+DOCS_SHARD = os.getenv("DOCS_SHARD")
+shard: Optional[tuple[int, int]] = (
+    parse_shard(DOCS_SHARD) if DOCS_SHARD else None
+)
+shard_name = f"shard-{shard[0]}-of-{shard[1]}" if shard else None
+
+
+def in_shard(doc_id: str) -> bool:
+    return shard is None or shard_of(doc_id, shard[1]) == shard[0]
+
+
+for doc_id in [doc_id for doc_id in docs if not in_shard(doc_id)]:
+    del docs[doc_id]
+
+# Serve every .md, .txt, .pdf and .docx file under DOCS_DIR as well. Worker
+# processes started by the ingester may import this module again, so only
+# the main process ingests.
+DOCS_DIR = os.getenv("DOCS_DIR")
+# doc id -> hash of the file under DOCS_DIR it was read from
+source_hashes: dict[str, str] = {}
+if DOCS_DIR and multiprocessing.parent_process() is None:
+    ingester = Ingester(
+        DOCS_DIR,
+        cache_dir=(
+            Path(DOCS_DIR, CACHE_DIR_NAME, shard_name) if shard_name else None
+        ),
+        select=in_shard,
+    )
+    for ingested in ingester.ingest():
+        docs[ingested.doc_id] = Document(
+            ingested.text, modified_at=ingested.mtime
+        )
+        source_hashes[ingested.doc_id] = ingested.sha256
+
+# With DOCS_DATA_DIR set, documents and every edit to them are kept on disk
+# there, and the stored copies take precedence over the ones above, except
+# where a file under DOCS_DIR changed since; that is stored as a new version
+DOCS_DATA_DIR = os.getenv("DOCS_DATA_DIR")
+store: Optional[DurableStore] = None
+if DOCS_DATA_DIR and multiprocessing.parent_process() is None:
+    store = DurableStore(
+        Path(DOCS_DATA_DIR, shard_name) if shard_name else DOCS_DATA_DIR
+    )
+    store.load(docs, source_hashes)
+
+# Built on the first search, so startup doesn't read every document
+search_index: Optional[SearchIndex] = None
+
+
+def get_search_index() -> SearchIndex:
+    global search_index
+    if search_index is None:
+        search_index = SearchIndex()
+        for doc_id, document in docs.items():
+            search_index.add(doc_id, document.text())
+    return search_index
+
+
+key_index = KeyIndex(docs)
+subscriptions = Subscriptions()
+
+
+def doc_uri(doc_id: str) -> str:
+    # Quoted like the uris clients read and subscribe to, so a "/" in an id
+    # can't make one document's uri a prefix of another's
+    return f"docs://documents/{quote(doc_id, safe='')}"
+
+
+def current_session() -> Optional[ServerSession]:
+    """The session of the request being handled, if any."""
+    with suppress(ValueError):
+        return mcp.get_context().session
+    return None
+
+
+# FastMCP builds its initialization options without notification options,
+# and the low-level server never advertises subscribe support. Neither has
+# a public hook for this, so the low-level server's get_capabilities is
+# replaced. It is private to the SDK, which is why pyproject.toml caps mcp
+# below 1.9; check this still works before raising the cap.
+_get_capabilities = mcp._mcp_server.get_capabilities
+
+
+def get_capabilities(notification_options, experimental_capabilities):
+    capabilities = _get_capabilities(
+        NotificationOptions(
+            prompts_changed=notification_options.prompts_changed,
+            resources_changed=True,
+            tools_changed=notification_options.tools_changed,
+        ),
+        experimental_capabilities,
+    )
+    capabilities.resources.subscribe = True
+    return capabilities
+
+
+mcp._mcp_server.get_capabilities = get_capabilities
+
+
+@mcp._mcp_server.subscribe_resource()
+async def subscribe_resource(uri: AnyUrl) -> None:
+    subscriptions.subscribe(str(uri), current_session())
+
+
+@mcp._mcp_server.unsubscribe_resource()
+async def unsubscribe_resource(uri: AnyUrl) -> None:
+    subscriptions.unsubscribe(str(uri), current_session())
+
+
+# Held while a document is edited, so that each edit is logged and applied
+# before the next one is matched against the text
+edit_locks: dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+
+async def log_edit(
+    doc_id: str, document: Document, spans: list[tuple[int, int, str]]
+) -> float:
+    """Makes an edit durable before it is applied, so an edit that fails
+    to be logged leaves the document unchanged. Returns the modification
+    time to give the document once the edit is applied."""
+    modified_at = time.time()
+    if store is not None:
+        await store.log_splices(
+            doc_id, spans, document.version + 1, modified_at
+        )
+    return modified_at
+
+
+def contain_cancelled_requests(server: Server) -> None:
+    """Keeps a request the client cancels from stopping server.
+
+    A request's context manager ignores whether its cancel scope caught the
+    cancellation, so the CancelledError escapes the request's task and
+    takes down the whole session, over stdio and in-process alike. Only
+    this server's message handler is wrapped, so other sessions in the
+    process, such as an in-process client's, are left alone. It relies on
+    private SDK state, like get_capabilities above.
+    """
+    handle_message = server._handle_message
+
+    async def handle_cancellable_message(message, *args):
+        try:
+            await handle_message(message, *args)
+        except anyio.get_cancelled_exc_class():
+            if not (
+                isinstance(message, RequestResponder)
+                and message._cancel_scope.cancel_called
+            ):
+                raise
+
+    server._handle_message = handle_cancellable_message
+
+
+contain_cancelled_requests(mcp._mcp_server)
+
+
+def not_modified(doc_id: str, if_none_match: Optional[str]) -> Optional[dict]:
+    """Returns a short not-modified reply if the client's copy of the
+    document, identified by its content hash, is still current.
+
+    Versions restart at 1 whenever the server does, so only the hash can
+    tell a changed or recreated document from the client's copy.
+    """
+    document = docs[doc_id]
+    if if_none_match != document.hash:
+        return None
+    return {
+        "doc_id": doc_id,
+        "not_modified": True,
+        "version": document.version,
+        "hash": document.hash,
+    }
+
+
+def read_versioned(doc_id: str) -> dict:
+    """Returns the full text of a document with its version and hash."""
+    document = docs[doc_id]
+    return {
+        "doc_id": doc_id,
+        "version": document.version,
+        "hash": document.hash,
+        "content": document.text(),
+    }
+
+
+def read_metadata(doc_ids: list[str]) -> dict:
+    """Returns the size, version and token estimate of each document,
+    without any of their content. Unknown ids are listed as missing."""
+    return {
+        "documents": [
+            {"doc_id": doc_id, **docs[doc_id].metadata()}
+            for doc_id in doc_ids
+            if doc_id in docs
+        ],
+        "missing": [doc_id for doc_id in doc_ids if doc_id not in docs],
+    }
+
+
+def read_page(
+    doc_id: str,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    start_line: Optional[int] = None,
+    end_line: Optional[int] = None,
+) -> dict:
+    """Reads part of a document, by character offset or by 1-based,
+    inclusive line range.
+
+    The reply carries the document's version and hash, total size and
+    line count, and a next_cursor to pass back as the offset of the
+    following read, which is None once the end of the document or of the
+    line range is reached.
+    """
+    if doc_id not in docs:
+        raise ValueError(f"Doc with id {doc_id} not found")
+    if limit is not None and limit <= 0:
+        # An empty page would hand back its own offset as the next cursor
+        raise ValueError(f"limit must be greater than 0, got {limit}")
+
+    document = docs[doc_id]
+    line_index = document.line_index
+
+    if start_line is not None:
+        offset = line_index.line_start(start_line - 1)
+    offset = min(max(offset, 0), len(document))
+
+    range_end = len(document)
+    if end_line is not None:
+        range_end = min(range_end, line_index.line_start(end_line))
+    end = offset + (limit if limit is not None else DEFAULT_PAGE_SIZE)
+    end = max(min(end, range_end), offset)
+
+    return {
+        "doc_id": doc_id,
+        "version": document.version,
+        "hash": document.hash,
+        "content": document.slice(offset, end),
+        "offset": offset,
+        "end": end,
+        "start_line": line_index.line_at(offset) + 1,
+        "end_line": line_index.line_at(max(end - 1, offset)) + 1,
+        "total_size": len(document),
+        "total_lines": line_index.line_count,
+        "next_cursor": str(end) if end < range_end else None,
+    }
+
 
 @mcp.tool(
     name="read_doc_contents",
-    description="Read the contents of a document and return it as a string.",
+    description=(
+        "Read the contents of a document and return it as a string. "
+        "For large documents pass offset/limit, a line range or a cursor to "
+        "read one page at a time; the reply then includes the total size "
+        "and a next_cursor for the following page. Pass if_none_match with "
+        "the hash from an earlier read to get a short not-modified reply "
+        "if the document has not changed since."
+    ),
 )
 def read_document(
     doc_id: str = Field(description="Id of the document to read"),
+    offset: Optional[int] = Field(
+        default=None, description="Character offset to start reading at"
+    ),
+    limit: Optional[int] = Field(
+        default=None,
+        description=f"Maximum number of characters to read (default {DEFAULT_PAGE_SIZE})",
+    ),
+    start_line: Optional[int] = Field(
+        default=None, description="First line to read, starting at 1"
+    ),
+    end_line: Optional[int] = Field(
+        default=None, description="Last line to read, inclusive"
+    ),
+    cursor: Optional[str] = Field(
+        default=None,
+        description="next_cursor from a previous read, to continue from there",
+    ),
+    if_none_match: Optional[str] = Field(
+        default=None,
+        description="Hash of the document from an earlier read",
+    ),
 ):
     if doc_id not in docs:
         raise ValueError(f"Doc with id {doc_id} not found")
 
-    return docs[doc_id]
+    unchanged = not_modified(doc_id, if_none_match)
+    if unchanged:
+        return unchanged
+
+    if all(
+        arg is None for arg in (offset, limit, start_line, end_line, cursor)
+    ):
+        if if_none_match is None:
+            return docs[doc_id].text()
+        return read_versioned(doc_id)
+
+    if cursor is not None:
+        # The cursor continues a read, so it takes over from where
+        # start_line began it
+        offset = int(cursor)
+        start_line = None
+
+    return read_page(
+        doc_id,
+        offset=offset or 0,
+        limit=limit,
+        start_line=start_line,
+        end_line=end_line,
+    )
 
 
 @mcp.tool(
     name="edit_document",
-    description="Edit a document by replacing a string in the documents content with a new string",
+    description=(
+        "Edit a document by replacing a string in the documents content with "
+        "a new string. Pass offset to replace only the occurrence starting at "
+        "that character offset, or count to limit how many occurrences are "
+        "replaced. Returns the number of replacements and the new version "
+        "of the document."
+    ),
 )
-def edit_document(
+async def edit_document(
     doc_id: str = Field(description="Id of the document that will be edited"),
     old_str: str = Field(
         description="The text to replace. Must match exactly, including whitespace"
@@ -49,23 +406,279 @@ def edit_document(
     new_str: str = Field(
         description="The new text to insert in place of the old text"
     ),
+    offset: Optional[int] = Field(
+        default=None,
+        description="Character offset where old_str starts, to replace only that occurrence",
+    ),
+    count: Optional[int] = Field(
+        default=None,
+        description="Maximum number of occurrences to replace, from the start of the document",
+    ),
 ):
     if doc_id not in docs:
         raise ValueError(f"Doc with id {doc_id} not found")
 
-    docs[doc_id] = docs[doc_id].replace(old_str, new_str)
+    document = docs[doc_id]
+    async with edit_locks[doc_id]:
+        if offset is not None:
+            end = offset + len(old_str)
+            if document.slice(offset, end) != old_str:
+                raise ValueError(
+                    f"Text at offset {offset} of {doc_id} "
+                    "does not match old_str"
+                )
+            spans = [(offset, end, new_str)]
+        else:
+            spans = [
+                (position, position + len(old_str), new_str)
+                for position in document.find_all(old_str, count)
+            ]
+        if not spans:
+            return {
+                "doc_id": doc_id,
+                "replaced": 0,
+                "version": document.version,
+            }
+
+        modified_at = await log_edit(doc_id, document, spans)
+        if offset is not None:
+            # Re-index only the tokens around the edit
+            start, stop = token_bounds(document, offset, end)
+            old_region = document.slice(start, stop)
+            document.replace_range(offset, end, new_str)
+            if search_index is not None:
+                search_index.update(
+                    doc_id,
+                    old_region,
+                    document.slice(start, stop + len(new_str) - len(old_str)),
+                )
+        else:
+            document.replace_spans(spans)
+            if search_index is not None:
+                search_index.add(doc_id, document.text())
+        document.modified_at = modified_at
+
+    replaced = len(spans)
+    await subscriptions.resource_updated(doc_uri(doc_id))
+
+    return {"doc_id": doc_id, "replaced": replaced, "version": document.version}
+
+
+class TextEdit(BaseModel):
+    old_str: str = Field(
+        description="The text to replace. Must match exactly, including whitespace"
+    )
+    new_str: str = Field(
+        description="The new text to insert in place of the old text"
+    )
+
+
+@mcp.tool(
+    name="edit_document_batch",
+    description=(
+        "Apply several replacements to a document at once. All edits are "
+        "matched against the original text in a single pass, left to "
+        "right; where two old strings overlap, the one that starts first "
+        "wins, and of those starting at the same place the longest wins. "
+        "If any old string is not found, nothing is changed. Returns how many times each edit "
+        "matched and the version and hash of the new content."
+    ),
+)
+async def edit_document_batch(
+    doc_id: str = Field(description="Id of the document that will be edited"),
+    edits: list[TextEdit] = Field(description="The replacements to apply"),
+):
+    if not edits:
+        raise ValueError("No edits given")
+    if doc_id not in docs:
+        raise ValueError(f"Doc with id {doc_id} not found")
+
+    document = docs[doc_id]
+    async with edit_locks[doc_id]:
+        matcher = MultiPattern([edit.old_str for edit in edits])
+        matches = matcher.find_all(document.text())
+
+        counts = [0] * len(edits)
+        for _, _, index in matches:
+            counts[index] += 1
+
+        missing = [
+            edits[i].old_str for i, count in enumerate(counts) if not count
+        ]
+        if missing:
+            raise ValueError(f"No matches in {doc_id} for: {missing}")
+
+        spans = [
+            (start, end, edits[index].new_str) for start, end, index in matches
+        ]
+        modified_at = await log_edit(doc_id, document, spans)
+        document.replace_spans(spans)
+        document.modified_at = modified_at
+        if search_index is not None:
+            search_index.add(doc_id, document.text())
+    await subscriptions.resource_updated(doc_uri(doc_id))
+
+    return {
+        "doc_id": doc_id,
+        "counts": counts,
+        "version": document.version,
+        "hash": document.hash,
+    }
+
+
+@mcp.tool(
+    name="create_document",
+    description="Create a new document with the given id and content.",
+)
+async def create_document(
+    doc_id: str = Field(description="Id of the new document"),
+    content: str = Field(description="The text of the new document"),
+):
+    if not in_shard(doc_id):
+        raise ValueError(f"Doc with id {doc_id} belongs to another shard")
+
+    async with edit_locks[doc_id]:
+        if doc_id in docs:
+            raise ValueError(f"Doc with id {doc_id} already exists")
+
+        # Logged before it is added, like an edit
+        document = Document(content)
+        if store is not None:
+            await store.log_create(doc_id, document)
+        docs[doc_id] = document
+        key_index.add(doc_id)
+        if search_index is not None:
+            search_index.add(doc_id, content)
+    await subscriptions.list_changed()
+
+    return {"doc_id": doc_id, "version": document.version}
+
+
+@mcp.tool(
+    name="search_docs",
+    description="Search all documents for the given terms. Returns the ids of the best matching documents, ranked by relevance, with a snippet of the matching text.",
+)
+def search_docs(
+    query: str = Field(description="Words to search for"),
+    limit: int = Field(
+        default=5, description="Maximum number of documents to return"
+    ),
+):
+    return [
+        {
+            "doc_id": doc_id,
+            "score": round(score, 4),
+            "snippet": make_snippet(docs[doc_id].text(), query),
+        }
+        for doc_id, score in get_search_index().search(query, limit)
+    ]
+
+
+@mcp.tool(
+    name="get_doc_metadata",
+    description=(
+        "Get the size in bytes, line count, version, content hash, last "
+        "modified time and estimated token count of one or more documents, "
+        "without reading their content. Use it to decide whether to read a "
+        "document whole or a page at a time."
+    ),
+)
+def get_doc_metadata(
+    doc_ids: list[str] = Field(description="Ids of the documents to describe"),
+):
+    return read_metadata(doc_ids)
 
 
 @mcp.resource("docs://documents", mime_type="application/json")
 def list_docs() -> list[str]:
+    watch_listing()
     return list(docs.keys())
 
 
+def watch_listing() -> None:
+    session = current_session()
+    if session is not None:
+        # Clients that have read the list are told when it changes
+        subscriptions.watch(session)
+
+
+def list_page(prefix: str, cursor: str) -> dict:
+    """Returns one page of document ids starting with prefix, in sorted
+    order, with the cursor and URI of the next page."""
+    watch_listing()
+    after = None if cursor == FIRST_PAGE else decode_cursor(cursor)
+    items, last = key_index.page(prefix, after, LIST_PAGE_SIZE)
+
+    next_cursor = next_uri = None
+    if last is not None:
+        next_cursor = encode_cursor(last)
+        path = f"prefix/{quote(prefix, safe='')}/page" if prefix else "page"
+        next_uri = f"docs://documents/{path}/{next_cursor}"
+
+    return {"items": items, "next_cursor": next_cursor, "next": next_uri}
+
+
+@mcp.resource("docs://documents/page/{cursor}", mime_type="application/json")
+def list_docs_page(cursor: str) -> dict:
+    return list_page("", cursor)
+
+
+@mcp.resource(
+    "docs://documents/prefix/{prefix}/page/{cursor}",
+    mime_type="application/json",
+)
+def list_docs_prefix_page(prefix: str, cursor: str) -> dict:
+    return list_page(unquote(prefix), cursor)
+
+
+@mcp.resource(
+    "docs://documents/metadata/{doc_ids}", mime_type="application/json"
+)
+def fetch_docs_metadata(doc_ids: str) -> dict:
+    """doc_ids is a comma separated list of URL-quoted document ids."""
+    return read_metadata([unquote(doc_id) for doc_id in doc_ids.split(",")])
+
+
 @mcp.resource("docs://documents/{doc_id}", mime_type="text/plain")
 def fetch_doc(doc_id: str) -> str:
+    doc_id = unquote(doc_id)
+    if doc_id not in docs:
+        raise ValueError(f"Doc with id {doc_id} not found")
+    return docs[doc_id].text()
+
+
+@mcp.resource(
+    "docs://documents/{doc_id}/if-none-match/{hash}",
+    mime_type="application/json",
+)
+def fetch_doc_if_modified(doc_id: str, hash: str) -> dict:
+    doc_id = unquote(doc_id)
     if doc_id not in docs:
         raise ValueError(f"Doc with id {doc_id} not found")
-    return docs[doc_id]
+
+    unchanged = not_modified(doc_id, hash)
+    if unchanged:
+        return unchanged
+
+    return read_versioned(doc_id)
+
+
+@mcp.resource(
+    "docs://documents/{doc_id}/range/{offset}/{limit}",
+    mime_type="application/json",
+)
+def fetch_doc_range(doc_id: str, offset: str, limit: str) -> dict:
+    return read_page(unquote(doc_id), offset=int(offset), limit=int(limit))
+
+
+@mcp.resource(
+    "docs://documents/{doc_id}/lines/{start_line}/{end_line}",
+    mime_type="application/json",
+)
+def fetch_doc_lines(doc_id: str, start_line: str, end_line: str) -> dict:
+    return read_page(
+        unquote(doc_id), start_line=int(start_line), end_line=int(end_line)
+    )
 
 
 @mcp.prompt(
@@ -76,7 +689,7 @@ def format_document(doc_id: str):
     if doc_id not in docs:
         raise ValueError(f"Document {doc_id} not found.")
     
-    content = docs[doc_id]
+    content = docs[doc_id].text()
     return [base.UserMessage(f"# Document: {doc_id}\n\n{content}\n")]
 
 @mcp.prompt(
@@ -87,7 +700,7 @@ def summarize_document(doc_id: str):
     if doc_id not in docs:
         raise ValueError(f"Document {doc_id} not found.")
     
-    content = docs[doc_id]
+    content = docs[doc_id].text()
     return [base.UserMessage(f"Summarize the following document:\n\n{content}\n")]
 
 
@@ -0,0 +1,123 @@
+import asyncio
+
+from mcp.server.fastmcp import FastMCP
+
+from mcp_client import MCPClient
+from mcp_server import contain_cancelled_requests
+
+
+class Calls:
+    """Counts the requests a test server answers, holding each one until
+    released."""
+
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+
+    async def handle(self) -> str:
+        self.started += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return f"answer {self.started}"
+
+
+def counting_server(calls: Calls) -> FastMCP:
+    server = FastMCP("Counting", log_level="ERROR")
+    contain_cancelled_requests(server._mcp_server)
+
+    @server.tool(name="lookup")
+    async def lookup(key: str) -> str:
+        return await calls.handle()
+
+    @server.resource("docs://value")
+    async def value() -> str:
+        return await calls.handle()
+
+    return server
+
+
+def connect(calls: Calls) -> MCPClient:
+    return MCPClient.in_process(
+        counting_server(calls), coalesce_tools=["lookup"]
+    )
+
+
+async def until(condition) -> None:
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+def test_identical_reads_share_one_request():
+    async def run():
+        calls = Calls()
+        async with connect(calls) as client:
+            reads = [
+                asyncio.create_task(
+                    client.read_resource("docs://value", use_cache=False)
+                )
+                for _ in range(5)
+            ]
+            await until(lambda: calls.started)
+            calls.release.set()
+            assert await asyncio.gather(*reads) == ["answer 1"] * 5
+            assert calls.started == 1
+            assert client.coalesced_requests == 4
+
+            # A later read is sent again
+            assert (
+                await client.read_resource("docs://value", use_cache=False)
+                == "answer 2"
+            )
+
+    asyncio.run(asyncio.wait_for(run(), 10))
+
+
+def test_only_identical_tool_calls_are_shared():
+    async def run():
+        calls = Calls()
+        async with connect(calls) as client:
+            lookups = [
+                asyncio.create_task(client.call_tool("lookup", {"key": key}))
+                for key in ["a", "a", "b"]
+            ]
+            await until(lambda: calls.started == 2)
+            calls.release.set()
+            results = await asyncio.gather(*lookups)
+            assert results[0].content[0].text == results[1].content[0].text
+            assert calls.started == 2
+
+    asyncio.run(asyncio.wait_for(run(), 10))
+
+
+def test_request_is_cancelled_only_with_its_last_caller():
+    async def run():
+        calls = Calls()
+        async with connect(calls) as client:
+            first, second = (
+                asyncio.create_task(
+                    client.read_resource("docs://value", use_cache=False)
+                )
+                for _ in range(2)
+            )
+            await until(lambda: calls.started)
+
+            first.cancel()
+            await asyncio.sleep(0.1)
+            assert calls.cancelled == 0
+            second.cancel()
+            await until(lambda: calls.cancelled)
+            assert first.cancelled() and second.cancelled()
+
+            # The session keeps serving requests
+            calls.release.set()
+            assert (
+                await client.read_resource("docs://value", use_cache=False)
+                == "answer 2"
+            )
+            assert client.connection_stats()["restarts"] == 0
+
+    asyncio.run(asyncio.wait_for(run(), 10))
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+from mcp.server.fastmcp import FastMCP
+
+from mcp_client import MCPClient
+from mcp_server import contain_cancelled_requests
+
+
+def slow_server() -> FastMCP:
+    server = FastMCP("Slow", log_level="ERROR")
+    contain_cancelled_requests(server._mcp_server)
+
+    @server.tool(name="sleep")
+    async def sleep(seconds: float) -> str:
+        await asyncio.sleep(seconds)
+        return "done"
+
+    return server
+
+
+def test_timed_out_call_leaves_in_process_session_running():
+    async def run():
+        async with MCPClient.in_process(slow_server()) as client:
+            other = asyncio.create_task(
+                client.call_tool("sleep", {"seconds": 0.5})
+            )
+            with pytest.raises(TimeoutError):
+                await client.call_tool("sleep", {"seconds": 10}, timeout=0.1)
+
+            # The call still in flight is answered normally
+            result = await other
+            assert result.content[0].text == "done"
+            assert client.connection_stats()["restarts"] == 0
+
+            result = await client.call_tool("sleep", {"seconds": 0})
+            assert result.content[0].text == "done"
+
+    asyncio.run(asyncio.wait_for(run(), 10))
@@ -0,0 +1,36 @@
+import pytest
+
+from docstore.multi_replace import MultiPattern
+
+
+def test_matches_every_pattern_in_order():
+    matcher = MultiPattern(["cat", "dog"])
+    assert matcher.find_all("dog cat dog") == [
+        (0, 3, 1),
+        (4, 7, 0),
+        (8, 11, 1),
+    ]
+
+
+def test_longest_pattern_wins_at_the_same_position():
+    assert MultiPattern(["a", "abc", "ab"]).find_all("abcab") == [
+        (0, 3, 1),
+        (3, 5, 2),
+    ]
+
+
+def test_earlier_match_wins_over_a_longer_overlapping_one():
+    assert MultiPattern(["ab", "bcd"]).find_all("abcd") == [(0, 2, 0)]
+
+
+def test_patterns_are_matched_literally():
+    assert MultiPattern(["a.b", "(x)"]).find_all("axb a.b (x)") == [
+        (4, 7, 0),
+        (8, 11, 1),
+    ]
+
+
+@pytest.mark.parametrize("patterns", [[], [""], ["a", "a"]])
+def test_invalid_patterns_are_rejected(patterns):
+    with pytest.raises(ValueError):
+        MultiPattern(patterns)
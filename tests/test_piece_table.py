@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from docstore.piece_table import MAX_PIECES, PieceTable
+
+
+def test_edits_match_string_slicing():
+    rng = random.Random(0)
+    table = PieceTable("the quick brown fox")
+    expected = str(table)
+    for _ in range(2000):
+        start = rng.randint(0, len(expected))
+        end = rng.randint(start, len(expected))
+        text = "".join(rng.choices("abc ", k=rng.randint(0, 5)))
+        table.replace_range(start, end, text)
+        expected = expected[:start] + text + expected[end:]
+
+        assert len(table) == len(expected)
+        a, b = sorted(rng.randint(-2, len(expected) + 2) for _ in range(2))
+        assert table.slice(a, b) == expected[max(a, 0) : max(b, 0)]
+        if rng.random() < 0.05:
+            assert table.text() == expected
+    assert table.text() == expected
+
+
+def test_replace_spans_uses_offsets_before_the_edit():
+    table = PieceTable("a-b-c-d")
+    table.replace_spans([(0, 1, "AA"), (2, 3, ""), (6, 7, "DDD")])
+    assert table.text() == "AA--c-DDD"
+
+
+def test_many_spans_are_applied_in_one_pass():
+    count = MAX_PIECES
+    table = PieceTable("x." * count)
+    table.replace_spans([(2 * i, 2 * i + 1, "yy") for i in range(count)])
+    assert table.text() == "yy." * count
+    assert table.piece_count == 1
+
+
+def test_find_all_and_replace():
+    table = PieceTable("aaaa ab aa")
+    assert table.find_all("aa") == [0, 2, 8]
+    assert table.find_all("aa", count=2) == [0, 2]
+    assert table.find_all("") == []
+    assert table.replace("aa", "b", count=2) == 2
+    assert table.text() == "bb ab aa"
+
+
+def test_replace_range_outside_the_text_is_rejected():
+    table = PieceTable("abc")
+    with pytest.raises(IndexError):
+        table.replace_range(2, 4, "x")
+    assert table.text() == "abc"
@@ -0,0 +1,56 @@
+from docstore.key_index import KeyIndex, decode_cursor, encode_cursor
+from docstore.shards import shard_of
+from mcp_client_pool import merge_metadata, merge_pages, merge_ranked
+
+
+def shard_pages(keys: list[str], shards: int, after, limit: int):
+    pages = []
+    for index in range(shards):
+        key_index = KeyIndex(k for k in keys if shard_of(k, shards) == index)
+        items, last = key_index.page("", after, limit)
+        pages.append(
+            {
+                "items": items,
+                "next_cursor": encode_cursor(last) if last else None,
+            }
+        )
+    return pages
+
+
+def test_merged_pages_list_every_id_once_in_order():
+    keys = [f"doc-{i}" for i in range(250)]
+    uri = "docs://documents/page/start"
+    listed = []
+    after = None
+    while True:
+        page = merge_pages(uri, shard_pages(keys, 3, after, 40))
+        listed += page["items"]
+        if page["next_cursor"] is None:
+            assert page["next"] is None
+            break
+        assert page["next"] == f"docs://documents/page/{page['next_cursor']}"
+        uri = page["next"]
+        after = decode_cursor(page["next_cursor"])
+    assert listed == sorted(keys)
+
+
+def test_merged_metadata_keeps_requested_order():
+    results = [
+        {"documents": [{"doc_id": "b"}], "missing": ["x"]},
+        {"documents": [{"doc_id": "a"}], "missing": []},
+    ]
+    assert merge_metadata(["a", "x", "b"], results) == {
+        "documents": [{"doc_id": "a"}, {"doc_id": "b"}],
+        "missing": ["x"],
+    }
+
+
+def test_merged_search_interleaves_shards_by_rank():
+    rankings = [
+        [{"doc_id": "a1", "score": 9.0}, {"doc_id": "a2", "score": 8.0}],
+        [{"doc_id": "b1", "score": 1.0}, {"doc_id": "b2", "score": 0.5}],
+        [],
+    ]
+    merged = merge_ranked(rankings, 3)
+    # A shard with higher scores doesn't crowd out another shard's best
+    assert [match["doc_id"] for match in merged] == ["a1", "b1", "a2"]
@@ -0,0 +1,79 @@
+import random
+
+from docstore.document import Document
+from docstore.search import SearchIndex, token_bounds
+
+
+def index_state(index: SearchIndex) -> tuple:
+    return (
+        index._postings,
+        index._doc_terms,
+        index._doc_lengths,
+        index._total_length,
+    )
+
+
+def test_rarer_and_more_frequent_terms_rank_higher():
+    index = SearchIndex()
+    index.add("pump.md", "pump pump pump valve")
+    index.add("valve.md", "valve valve housing")
+    index.add("other.md", "housing report")
+    index.add("empty.md", "")
+
+    assert [doc_id for doc_id, _ in index.search("pump")] == ["pump.md"]
+    assert [doc_id for doc_id, _ in index.search("valve")] == [
+        "valve.md",
+        "pump.md",
+    ]
+    assert index.search("Valve HOUSING", limit=1)[0][0] == "valve.md"
+    assert index.search("missing") == []
+
+
+def test_replacing_and_removing_documents():
+    index = SearchIndex()
+    index.add("a.md", "alpha beta")
+    index.add("a.md", "gamma")
+    assert index.search("alpha") == []
+    assert index.search("gamma")[0][0] == "a.md"
+
+    index.remove("a.md")
+    assert len(index) == 0
+    assert index.search("gamma") == []
+    assert index_state(index) == index_state(SearchIndex())
+
+
+def test_local_updates_match_reindexing():
+    rng = random.Random(0)
+    words = ["pump", "valve", "tower", "a", "b"]
+    document = Document(" ".join(rng.choices(words, k=200)))
+    index = SearchIndex()
+    index.add("a.md", document.text())
+    index.add("b.md", "pump tower")
+
+    for _ in range(300):
+        start = rng.randint(0, len(document))
+        end = min(start + rng.randint(0, 12), len(document))
+        new = rng.choice(["", " ", "pump", "va", "lve x", "tower."])
+        old_length = end - start
+
+        bounds_start, bounds_end = token_bounds(document, start, end, chunk=4)
+        old_region = document.slice(bounds_start, bounds_end)
+        document.replace_range(start, end, new)
+        new_region = document.slice(
+            bounds_start, bounds_end + len(new) - old_length
+        )
+        index.update("a.md", old_region, new_region)
+
+    rebuilt = SearchIndex()
+    rebuilt.add("a.md", document.text())
+    rebuilt.add("b.md", "pump tower")
+    assert index_state(index) == index_state(rebuilt)
+    assert index.search("pump valve") == rebuilt.search("pump valve")
+
+
+def test_token_bounds_widen_to_whole_tokens():
+    document = Document("alpha beta,gamma")
+    assert token_bounds(document, 7, 8, chunk=2) == (6, 10)
+    # Removing the space would join the tokens on either side
+    assert token_bounds(document, 5, 6) == (0, 10)
+    assert token_bounds(document, 0, 16) == (0, 16)
@@ -0,0 +1,26 @@
+import pytest
+
+import mcp_server
+from docstore.document import Document
+
+
+@pytest.mark.parametrize("limit", ["0", "-5"])
+def test_page_limit_must_be_positive(monkeypatch, limit):
+    monkeypatch.setitem(mcp_server.docs, "a.md", Document("abc"))
+    with pytest.raises(ValueError, match="limit"):
+        mcp_server.fetch_doc_range("a.md", "0", limit)
+    with pytest.raises(ValueError, match="limit"):
+        mcp_server.read_document(
+            "a.md", 0, int(limit), None, None, None, None
+        )
+
+
+def test_pages_cover_the_document_once(monkeypatch):
+    monkeypatch.setitem(mcp_server.docs, "a.md", Document("x" * 25))
+    contents = []
+    offset = "0"
+    while offset is not None:
+        page = mcp_server.fetch_doc_range("a.md", offset, "10")
+        contents.append(page["content"])
+        offset = page["next_cursor"]
+    assert [len(content) for content in contents] == [10, 10, 5]
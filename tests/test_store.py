@@ -0,0 +1,221 @@
+import asyncio
+import threading
+
+import pytest
+
+import docstore.store as store_module
+from docstore.document import Document
+from docstore.snapshot import write_snapshot
+from docstore.store import DurableStore, list_snapshots
+from docstore.wal import list_segments, segment_path
+
+
+async def edit(
+    store: DurableStore, doc_id: str, old: str, new: str
+) -> None:
+    """Logs replacing every old in a document, then applies it, as the
+    server does."""
+    document = store.docs[doc_id]
+    spans = [
+        (position, position + len(old), new)
+        for position in document.find_all(old)
+    ]
+    assert spans
+    await store.log_splices(
+        doc_id, spans, document.version + 1, document.modified_at
+    )
+    document.replace_spans(spans)
+
+
+def crash(store: DurableStore) -> None:
+    """Stops using a store without closing it or taking a snapshot."""
+    store.wal._file.close()
+
+
+def reopen(directory, docs=None, source_hashes=None) -> dict[str, Document]:
+    docs = {} if docs is None else docs
+    DurableStore(directory).load(docs, source_hashes)
+    return docs
+
+
+def test_replay_after_crash(tmp_path):
+    async def run():
+        store = DurableStore(tmp_path)
+        store.load({"a.md": Document("one two three")})
+        await edit(store, "a.md", "two", "2")
+        await edit(store, "a.md", "three", "3")
+        store.docs["b.md"] = Document("new")
+        await store.log_create("b.md", store.docs["b.md"])
+        await edit(store, "b.md", "new", "newer")
+        crash(store)
+        # A record torn by the crash, which must be ignored
+        path = segment_path(tmp_path, store.wal.segment)
+        with open(path, "ab") as f:
+            f.write(b"\x40\x00\x00\x00\x00\x00")
+
+    asyncio.run(run())
+
+    docs = reopen(tmp_path)
+    assert docs["a.md"].text() == "one 2 3"
+    assert docs["a.md"].version == 3
+    assert docs["b.md"].text() == "newer"
+    assert docs["b.md"].version == 2
+
+    # Records are replayed exactly once across repeated restarts
+    docs = reopen(tmp_path)
+    assert docs["a.md"].text() == "one 2 3"
+    assert docs["a.md"].version == 3
+
+
+def test_stored_copies_replace_initial_documents(tmp_path):
+    async def run():
+        store = DurableStore(tmp_path)
+        store.load({"a.md": Document("draft")})
+        await edit(store, "a.md", "draft", "final")
+        crash(store)
+
+    asyncio.run(run())
+
+    docs = reopen(tmp_path, {"a.md": Document("draft")})
+    assert docs["a.md"].text() == "final"
+
+
+def test_snapshot_with_edits_in_flight(tmp_path, monkeypatch):
+    writing = threading.Event()
+    edited = threading.Event()
+
+    def slow_write_snapshot(*args):
+        writing.set()
+        edited.wait(5)
+        write_snapshot(*args)
+
+    def token(round: int) -> str:
+        # Grows every round, so replaying an edit twice changes the text
+        return "[" + "x" * round + "]"
+
+    async def run() -> dict[str, tuple[str, int]]:
+        store = DurableStore(tmp_path)
+        store.load(
+            {
+                f"{i}.md": Document(" ".join([token(0)] * 1000))
+                for i in range(20)
+            }
+        )
+        monkeypatch.setattr(
+            store_module, "write_snapshot", slow_write_snapshot
+        )
+
+        async def edit_all(round: int):
+            for i in range(20):
+                await edit(store, f"{i}.md", token(round), token(round + 1))
+                await asyncio.sleep(0)
+
+        await edit_all(0)
+        snapshot = asyncio.create_task(store.snapshot())
+        # Made before the documents are captured, but logged after the
+        # log is rotated, so the snapshot already has them
+        await edit_all(1)
+        assert await asyncio.to_thread(writing.wait, 5)
+        # Made while the snapshot is being written
+        await edit_all(2)
+        edited.set()
+        await snapshot
+        await edit_all(3)
+        crash(store)
+        return {
+            doc_id: (document.text(), document.version)
+            for doc_id, document in store.docs.items()
+        }
+
+    expected = asyncio.run(run())
+
+    assert len(list_snapshots(tmp_path)) == 1
+    assert min(list_segments(tmp_path)) >= list_snapshots(tmp_path)[0]
+    docs = reopen(tmp_path)
+    assert {
+        doc_id: (document.text(), document.version)
+        for doc_id, document in docs.items()
+    } == expected
+
+
+def test_changed_source_is_stored_as_new_version(tmp_path):
+    async def run():
+        store = DurableStore(tmp_path)
+        store.load({"a.md": Document("v1")}, {"a.md": "hash1"})
+        await edit(store, "a.md", "v1", "v1 edited")
+        crash(store)
+
+    asyncio.run(run())
+
+    # An unchanged file leaves the stored edits in place
+    docs = reopen(tmp_path, {"a.md": Document("v1")}, {"a.md": "hash1"})
+    assert docs["a.md"].text() == "v1 edited"
+    assert docs["a.md"].version == 2
+
+    docs = reopen(tmp_path, {"a.md": Document("v2")}, {"a.md": "hash2"})
+    assert docs["a.md"].text() == "v2"
+    assert docs["a.md"].version == 3
+
+    # The new version is durable, and not logged again
+    docs = reopen(tmp_path, {"a.md": Document("v2")}, {"a.md": "hash2"})
+    assert docs["a.md"].text() == "v2"
+    assert docs["a.md"].version == 3
+    docs = reopen(tmp_path)
+    assert docs["a.md"].text() == "v2"
+
+
+def test_edit_that_fails_to_be_logged_is_not_applied(tmp_path, monkeypatch):
+    import mcp_server
+
+    def failing_write(data: bytes) -> None:
+        raise OSError("disk full")
+
+    async def run():
+        store = DurableStore(tmp_path)
+        store.load({"a.md": Document("one two")})
+        monkeypatch.setattr(mcp_server, "store", store)
+        monkeypatch.setattr(mcp_server, "search_index", None)
+        monkeypatch.setitem(mcp_server.docs, "a.md", store.docs["a.md"])
+
+        async def edit_document(old: str, new: str) -> dict:
+            return await mcp_server.edit_document(
+                "a.md", old, new, None, None
+            )
+
+        await edit_document("one", "1")
+        monkeypatch.setattr(store.wal, "_write", failing_write)
+        with pytest.raises(OSError, match="disk full"):
+            await edit_document("two", "2")
+        assert store.docs["a.md"].text() == "1 two"
+        assert store.docs["a.md"].version == 2
+
+        # Later edits are refused even once writes would succeed again
+        monkeypatch.delattr(store.wal, "_write")
+        with pytest.raises(OSError, match="server restarts"):
+            await edit_document("1", "one")
+        assert store.docs["a.md"].text() == "1 two"
+        crash(store)
+
+    asyncio.run(run())
+
+    docs = reopen(tmp_path)
+    assert docs["a.md"].text() == "1 two"
+    assert docs["a.md"].version == 2
+
+
+def test_replayed_log_counts_towards_snapshot(tmp_path):
+    async def run(round: int):
+        store = DurableStore(tmp_path, snapshot_threshold=200)
+        store.load({"a.md": Document("0")})
+        # Each run logs less than the threshold on its own
+        await edit(store, "a.md", str(round), str(round + 1))
+        await store.close()
+
+    for round in range(10):
+        asyncio.run(run(round))
+
+    assert len(list_snapshots(tmp_path)) == 1
+    assert len(list_segments(tmp_path)) < 10
+    docs = reopen(tmp_path)
+    assert docs["a.md"].text() == "10"
+    assert docs["a.md"].version == 11
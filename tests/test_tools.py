@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+from anthropic.types import Message, ToolUseBlock
+
+from core.tools import ToolManager
+from mcp_client import ConnectionLostError
+
+
+class LostClient:
+    tools_version = 0
+
+    async def list_tools(self):
+        raise ConnectionLostError("server exited")
+
+
+def tool_use_message(*ids: str) -> Message:
+    return Message(
+        id="msg",
+        type="message",
+        role="assistant",
+        model="model",
+        content=[
+            ToolUseBlock(id=id, type="tool_use", name="read", input={})
+            for id in ids
+        ],
+        stop_reason="tool_use",
+        usage={"input_tokens": 0, "output_tokens": 0},
+    )
+
+
+def test_failed_tool_listing_answers_every_tool_use():
+    results = asyncio.run(
+        ToolManager.execute_tool_requests(
+            {"docs": LostClient()}, tool_use_message("a", "b")
+        )
+    )
+    assert [result["tool_use_id"] for result in results] == ["a", "b"]
+    assert all(result["is_error"] for result in results)
+    assert "server exited" in json.loads(results[0]["content"])["error"]
+
+
+class CountingClient:
+    tools_version = 0
+
+    def __init__(self):
+        self.listings = 0
+
+    async def list_tools(self):
+        self.listings += 1
+        return []
+
+
+def test_tools_are_listed_once_without_a_catalog():
+    client = CountingClient()
+
+    async def run():
+        for _ in range(3):
+            await ToolManager.get_all_tools({"docs": client})
+            await ToolManager.execute_tool_requests(
+                {"docs": client}, tool_use_message("a")
+            )
+
+    asyncio.run(run())
+    assert client.listings == 1